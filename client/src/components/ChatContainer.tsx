@@ -10,6 +10,8 @@ export default function ChatContainer() {
         handleSendMessage, 
         clearContext, 
         isTyping,
+        queuePosition,
+        uploadProgress,
         images,
         isImageCarouselOpen,
         setIsImageCarouselOpen
@@ -31,12 +33,14 @@ export default function ChatContainer() {
                 </div>
             </div>
             <div className="lg:col-span-8 h-full">
-                {context.csvContent ? (
+                {context.csvFile ? (
                     <ChatMessages 
                         messages={context.messages} 
                         onSendMessage={handleSendMessage}
                         onClear={clearContext}
                         isTyping={isTyping}
+                        queuePosition={queuePosition}
+                        uploadProgress={uploadProgress}
                         images={images}
                         isImageCarouselOpen={isImageCarouselOpen}
                         setIsImageCarouselOpen={setIsImageCarouselOpen}
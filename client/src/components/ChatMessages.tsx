@@ -9,6 +9,8 @@ interface ChatMessagesProps {
     onSendMessage: (content: string) => void;
     onClear: () => void;
     isTyping: boolean;
+    queuePosition: number | null;
+    uploadProgress: number | null;
     images: MessageAttachment[];
     isImageCarouselOpen: boolean;
     setIsImageCarouselOpen: (isOpen: boolean) => void;
@@ -19,6 +21,8 @@ export default function ChatMessages({
     onSendMessage, 
     onClear, 
     isTyping,
+    queuePosition,
+    uploadProgress,
     images,
     isImageCarouselOpen,
     setIsImageCarouselOpen 
@@ -85,7 +89,12 @@ export default function ChatMessages({
                     {isTyping && (
                         <div className="mr-auto max-w-[80%] w-full bg-excel-50/50 p-4 rounded-lg border border-excel-100">
                             <div className="text-xl text-excel-600 mb-1">
-                                {config.assistant.name} {config.assistant.typingText}
+                                {config.assistant.name}{' '}
+                                {queuePosition
+                                    ? `${config.assistant.queuedText} ${queuePosition})...`
+                                    : uploadProgress !== null
+                                        ? `${config.assistant.uploadingText} (${Math.round(uploadProgress * 100)}%)...`
+                                        : config.assistant.typingText}
                             </div>
                         </div>
                     )}
@@ -1,17 +1,23 @@
 import { useState } from 'react';
+import { CsvPreview } from '../types';
+import { previewCsvFile } from '../utils/csvUpload';
+
+// Rows shown in the preview; the rest of the file is never loaded on the page
+const PREVIEW_ROWS = 20;
 
 interface FileInputProps {
-    onAnalysis: (content: string) => void;
+    onAnalysis: (file: File) => void;
 }
 
 export default function FileInput({ onAnalysis }: FileInputProps) {
     const [error, setError] = useState<string>('');
-    const [csvContent, setCsvContent] = useState<string>('');
+    const [preview, setPreview] = useState<CsvPreview | null>(null);
+    const [fileSize, setFileSize] = useState(0);
     const [isDragging, setIsDragging] = useState(false);
 
     const handleFileInput = (file: File | null) => {
         setError('');
-        setCsvContent('');
+        setPreview(null);
 
         if (!file) return;
 
@@ -20,13 +26,12 @@ export default function FileInput({ onAnalysis }: FileInputProps) {
             return;
         }
 
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            const text = e.target?.result as string;
-            setCsvContent(text);
-            onAnalysis(text);
-        };
-        reader.readAsText(file);
+        // Start the upload right away; the preview is read in a Web Worker meanwhile
+        onAnalysis(file);
+        setFileSize(file.size);
+        previewCsvFile(file, PREVIEW_ROWS)
+            .then(setPreview)
+            .catch(() => setError('Could not read the CSV file'));
     };
 
     const handleFileChange = (event: React.ChangeEvent<HTMLInputElement>) => {
@@ -83,12 +88,32 @@ export default function FileInput({ onAnalysis }: FileInputProps) {
             {error && (
                 <div className="text-red-500 text-sm">{error}</div>
             )}
-            {csvContent && (
+            {preview && (
                 <div className="w-full mt-4 ">
                     <h2 className="text-xl mb-2 text-excel-600">CSV Content:</h2>
-                    <pre className="bg-white p-4 max-h-64 text-left overflow-auto rounded-lg border border-excel-300 overflow-x-auto text-[0.5rem]">
-                        {csvContent}
-                    </pre>
+                    <div className="bg-white p-4 max-h-64 text-left overflow-auto rounded-lg border border-excel-300 text-[0.5rem]">
+                        <table className="font-mono whitespace-nowrap">
+                            <thead>
+                                <tr>
+                                    {preview.headers.map((header, i) => (
+                                        <th key={i} className="pr-2 text-left">{header}</th>
+                                    ))}
+                                </tr>
+                            </thead>
+                            <tbody>
+                                {preview.rows.map((row, i) => (
+                                    <tr key={i}>
+                                        {row.map((value, j) => (
+                                            <td key={j} className="pr-2">{value}</td>
+                                        ))}
+                                    </tr>
+                                ))}
+                            </tbody>
+                        </table>
+                    </div>
+                    <div className="text-excel-600 text-sm mt-1">
+                        First {preview.rows.length} rows of {(fileSize / (1024 * 1024)).toFixed(1)} MB
+                    </div>
                 </div>
             )}
         </div>
@@ -3,5 +3,7 @@ export const config = {
     assistant: {
         name: 'Data Dave',
         typingText: 'is analyzing your data...',
+        queuedText: 'is waiting for the server (queue position',
+        uploadingText: 'is receiving your file',
     }
 } as const;
\ No newline at end of file
@@ -6,8 +6,12 @@ import {
     ThreadCreatedPayload,
     MessageReceivedPayload,
     ImageReceivedPayload,
+    CsvHashStatusPayload,
+    CsvProcessedPayload,
+    ToolQueuedPayload,
 } from '../types';
 import { socket } from '../utils/socket';
+import { cancelCsvUpload, hashCsvFile, uploadCsvFile } from '../utils/csvUpload';
 
 export function useChat() {
     const [context, setContext] = useState<ChatContext>({ messages: [] });
@@ -15,20 +19,44 @@ export function useChat() {
     const [isTyping, setIsTyping] = useState(false);
     const [images, setImages] = useState<MessageAttachment[]>([]);
     const [isImageCarouselOpen, setIsImageCarouselOpen] = useState(false);
+    // Set while the server has a tool call waiting for a free worker
+    const [queuePosition, setQueuePosition] = useState<number | null>(null);
+    // Fraction of the CSV file sent so far, while it uploads
+    const [uploadProgress, setUploadProgress] = useState<number | null>(null);
+
+    const uploadFile = (file: File, threadId: string) => {
+        setUploadProgress(0);
+        uploadCsvFile(file, threadId, (sent, total) => setUploadProgress(total ? sent / total : 1));
+    };
 
     useEffect(() => {
         socket.on('thread_created', (data: ThreadCreatedPayload) => {
             setThreadId(data.thread_id);
             socket.emit('join_thread', { thread_id: data.thread_id });
-            if (context.csvContent) {
+            const file = context.csvFile;
+            if (file) {
                 setIsTyping(true); // Set typing when sending CSV
-                socket.emit('send_csv', { thread_id: data.thread_id, csvContent: context.csvContent });
+                // Offer the content hash first (computed in a Web Worker); the server
+                // skips the upload if it already has the dataset
+                hashCsvFile(file)
+                    .then(hash => socket.emit('send_csv_hash', { thread_id: data.thread_id, hash }))
+                    .catch(() => uploadFile(file, data.thread_id));
+            }
+        });
+
+        socket.on('csv_hash_status', (data: CsvHashStatusPayload) => {
+            if (data.status === 'missing' && context.csvFile) {
+                uploadFile(context.csvFile, data.thread_id);
             }
         });
 
-        socket.on('csv_processed', () => {
+        socket.on('csv_processed', (data: CsvProcessedPayload) => {
+            setUploadProgress(null);
             // Keep typing true as the assistant will be generating initial response
-            setIsTyping(true);
+            // (a dataset restored on rejoin gets no new response)
+            if (!data.restored) {
+                setIsTyping(true);
+            }
         });
 
         socket.on('message_received', (data: MessageReceivedPayload) => {
@@ -68,6 +96,11 @@ export function useChat() {
                 };
             });
             setIsTyping(false);
+            setQueuePosition(null);
+        });
+
+        socket.on('tool_queued', (data: ToolQueuedPayload) => {
+            setQueuePosition(data.position);
         });
 
         socket.on('message_sent', () => {
@@ -80,6 +113,7 @@ export function useChat() {
                 type: 'image'
             };
             setImages(prev => [...prev, newImage]);
+            setQueuePosition(null);
 
         });
 
@@ -89,6 +123,7 @@ export function useChat() {
                 messages: []
             }));
             setIsTyping(false);
+            setQueuePosition(null);
         });
 
         return () => {
@@ -98,14 +133,31 @@ export function useChat() {
             socket.off('message_sent');
             socket.off('thread_cleared');
             socket.off('csv_processed');
+            socket.off('csv_hash_status');
+            socket.off('tool_queued');
+        };
+    }, [context.csvFile]);
+
+    useEffect(() => {
+        // Rejoin the thread after a reconnect; if the server restarted, it restores the thread's datasets
+        const rejoin = () => {
+            if (threadId) {
+                socket.emit('join_thread', { thread_id: threadId });
+            }
+        };
+        socket.io.on('reconnect', rejoin);
+        return () => {
+            socket.io.off('reconnect', rejoin);
         };
-    }, [context.csvContent]);
+    }, [threadId]);
 
-    const handleFileAnalysis = (content: string) => {
+    const handleFileAnalysis = (file: File) => {
+        cancelCsvUpload(); // Stop sending a previous file
+        setUploadProgress(null);
         // Clear existing messages and images
         setContext({
             messages: [],
-            csvContent: content
+            csvFile: file
         });
         setImages([]); // Reset images array
         
@@ -139,9 +191,9 @@ export function useChat() {
     const clearContext = () => {
         if (!threadId) return;
         
-        // Preserve CSV content while clearing messages
-        const csvContent = context.csvContent;
-        setContext({ messages: [], csvContent });
+        // Preserve the CSV file while clearing messages
+        const csvFile = context.csvFile;
+        setContext({ messages: [], csvFile });
         setImages([]); // Reset images array
         
         // Emit clear event to server
@@ -157,6 +209,8 @@ export function useChat() {
         handleFileAnalysis,
         clearContext,
         isTyping,
+        queuePosition,
+        uploadProgress,
         images,
         isImageCarouselOpen,
         setIsImageCarouselOpen
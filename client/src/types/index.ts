@@ -15,7 +15,7 @@ export interface Message {
 
 export interface ChatContext {
     messages: Message[];
-    csvContent?: string;
+    csvFile?: File;
 }
 
 export interface ThreadCreatedPayload {
@@ -30,6 +30,46 @@ export interface ImageReceivedPayload {
     image_data: string;
 }
 
+export interface CsvProcessedPayload {
+    thread_id: string;
+    headers: string[];
+    name: string;
+    restored?: boolean;
+}
+
+export interface ToolQueuedPayload {
+    thread_id: string;
+    tool: string;
+    position: number;
+}
+
 export interface ThreadClearedPayload {
     thread_id: string;
 }
+
+
+export interface CsvHashStatusPayload {
+    thread_id: string;
+    hash: string;
+    status: 'present' | 'missing';
+}
+
+export interface CsvPreview {
+    headers: string[];
+    rows: string[][];
+    delimiter: string;
+}
+
+// Messages to and from the CSV Web Worker (see workers/csvWorker.ts)
+export type CsvWorkerRequest =
+    | { type: 'preview'; file: File; rows: number }
+    | { type: 'hash'; file: File }
+    | { type: 'upload'; file: File; chunkBytes: number; window: number }
+    | { type: 'ack' }
+    | { type: 'cancel' };
+
+export type CsvWorkerResponse =
+    | { type: 'preview'; preview: CsvPreview }
+    | { type: 'hash'; hash: string }
+    | { type: 'chunk'; index: number; text: string; final: boolean; bytes: number; total: number }
+    | { type: 'error'; task: 'preview' | 'hash' | 'upload'; message: string };
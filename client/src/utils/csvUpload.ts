@@ -0,0 +1,110 @@
+import { socket } from './socket';
+import type { CsvPreview, CsvWorkerRequest, CsvWorkerResponse } from '../types';
+
+// Bytes of the file per send_csv_chunk message. Kept well under the server's
+// 1 MB message limit, since escaping can grow the text in transit.
+const CHUNK_BYTES = 256 * 1024;
+
+// Chunks sent ahead of the server's acknowledgements
+const CHUNK_WINDOW = 4;
+
+let worker: Worker | null = null;
+let currentUpload: string | null = null;
+
+function csvWorker(): Worker {
+    if (!worker) {
+        worker = new Worker(new URL('../workers/csvWorker.ts', import.meta.url), { type: 'module' });
+    }
+    return worker;
+}
+
+function send(request: CsvWorkerRequest) {
+    csvWorker().postMessage(request);
+}
+
+// Resolves with the worker's next reply of the given type (or rejects on its error for that task)
+function reply<T extends 'preview' | 'hash'>(type: T): Promise<Extract<CsvWorkerResponse, { type: T }>> {
+    return new Promise((resolve, reject) => {
+        const onMessage = (event: MessageEvent<CsvWorkerResponse>) => {
+            const message = event.data;
+            if (message.type === type) {
+                csvWorker().removeEventListener('message', onMessage);
+                resolve(message as Extract<CsvWorkerResponse, { type: T }>);
+            } else if (message.type === 'error' && message.task === type) {
+                csvWorker().removeEventListener('message', onMessage);
+                reject(new Error(message.message));
+            }
+        };
+        csvWorker().addEventListener('message', onMessage);
+    });
+}
+
+// Header and first rows of a CSV file, read without loading the rest of it
+export async function previewCsvFile(file: File, rows: number): Promise<CsvPreview> {
+    const result = reply('preview');
+    send({ type: 'preview', file, rows });
+    return (await result).preview;
+}
+
+// Hex SHA-256 of the file's text; matches the server's dataset hash
+export async function hashCsvFile(file: File): Promise<string> {
+    const result = reply('hash');
+    send({ type: 'hash', file });
+    return (await result).hash;
+}
+
+// Streams the file to the server with send_csv_chunk, replacing any upload
+// still in progress. onProgress receives the bytes sent and the file size.
+export function uploadCsvFile(
+    file: File,
+    threadId: string,
+    onProgress?: (sent: number, total: number) => void
+) {
+    const uploadId = crypto.randomUUID();
+    currentUpload = uploadId;
+
+    const onMessage = (event: MessageEvent<CsvWorkerResponse>) => {
+        const message = event.data;
+        if (currentUpload !== uploadId) {
+            csvWorker().removeEventListener('message', onMessage);
+            return;
+        }
+        if (message.type === 'error' && message.task === 'upload') {
+            console.error('CSV upload failed:', message.message);
+            csvWorker().removeEventListener('message', onMessage);
+            return;
+        }
+        if (message.type !== 'chunk') return;
+
+        socket.emit(
+            'send_csv_chunk',
+            {
+                thread_id: threadId,
+                upload_id: uploadId,
+                index: message.index,
+                chunk: message.text,
+                final: message.final,
+            },
+            (ack: { error?: string }) => {
+                if (currentUpload !== uploadId) return;
+                if (ack?.error) {
+                    console.error('CSV upload rejected:', ack.error);
+                    cancelCsvUpload();
+                    return;
+                }
+                send({ type: 'ack' });
+                onProgress?.(message.bytes, message.total);
+            }
+        );
+        if (message.final) {
+            csvWorker().removeEventListener('message', onMessage);
+        }
+    };
+    csvWorker().addEventListener('message', onMessage);
+    send({ type: 'upload', file, chunkBytes: CHUNK_BYTES, window: CHUNK_WINDOW });
+}
+
+export function cancelCsvUpload() {
+    currentUpload = null;
+    send({ type: 'cancel' });
+}
@@ -0,0 +1,7 @@
+// Hex SHA-256 of UTF-8 bytes; matches the server's dataset hash of the same text
+export async function sha256Hex(bytes: BufferSource): Promise<string> {
+    const digest = await crypto.subtle.digest('SHA-256', bytes);
+    return Array.from(new Uint8Array(digest))
+        .map(b => b.toString(16).padStart(2, '0'))
+        .join('');
+}
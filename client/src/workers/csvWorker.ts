@@ -0,0 +1,155 @@
+// Reads, previews, hashes and slices CSV files off the main thread, so picking
+// a large file never freezes the page.
+import type { CsvPreview, CsvWorkerRequest, CsvWorkerResponse } from '../types';
+import { sha256Hex } from '../utils/hash';
+
+const ctx = self as unknown as Worker;
+
+// Bytes read for the preview; plenty for the header and the first rows
+const PREVIEW_BYTES = 64 * 1024;
+const DELIMITERS = [',', ';', '\t', '|'];
+
+let acked = 0;
+let sent = 0;
+let wakeUpload: (() => void) | null = null;
+// Bumped to stop the current upload, whether by cancel or by a new upload
+let generation = 0;
+
+function post(message: CsvWorkerResponse) {
+    ctx.postMessage(message);
+}
+
+// Picks the candidate delimiter that occurs most often in the header line
+function detectDelimiter(text: string): string {
+    const header = text.split(/\r?\n/, 1)[0];
+    let best = ',';
+    let bestCount = 0;
+    for (const delimiter of DELIMITERS) {
+        const count = header.split(delimiter).length - 1;
+        if (count > bestCount) {
+            best = delimiter;
+            bestCount = count;
+        }
+    }
+    return best;
+}
+
+// Splits CSV text into at most limit records. Quoted fields may hold
+// delimiters, doubled quotes and line breaks. Unless complete is set, the
+// text may end mid-record, so the last record is dropped.
+function parseRecords(text: string, delimiter: string, limit: number, complete: boolean): string[][] {
+    const records: string[][] = [];
+    let record: string[] = [];
+    let field = '';
+    let quoted = false;
+    for (let i = 0; i < text.length && records.length < limit; i++) {
+        const char = text[i];
+        if (quoted) {
+            if (char === '"' && text[i + 1] === '"') {
+                field += '"';
+                i++;
+            } else if (char === '"') {
+                quoted = false;
+            } else {
+                field += char;
+            }
+        } else if (char === '"') {
+            quoted = true;
+        } else if (char === delimiter) {
+            record.push(field);
+            field = '';
+        } else if (char === '\n' || char === '\r') {
+            if (char === '\r' && text[i + 1] === '\n') i++;
+            record.push(field);
+            field = '';
+            if (record.length > 1 || record[0] !== '') records.push(record); // skip blank lines
+            record = [];
+        } else {
+            field += char;
+        }
+    }
+    if (complete && records.length < limit && (record.length > 0 || field !== '')) {
+        record.push(field);
+        records.push(record);
+    }
+    return records;
+}
+
+async function preview(file: File, rows: number): Promise<CsvPreview> {
+    const text = await file.slice(0, PREVIEW_BYTES).text();
+    const delimiter = detectDelimiter(text);
+    const [headers = [], ...data] = parseRecords(text, delimiter, rows + 1, file.size <= PREVIEW_BYTES);
+    return { headers, rows: data, delimiter };
+}
+
+// Hex SHA-256 of the file's text as the server will receive it (UTF-8, without a byte order mark)
+async function hash(file: File): Promise<string> {
+    let bytes = new Uint8Array(await file.arrayBuffer());
+    if (bytes[0] === 0xef && bytes[1] === 0xbb && bytes[2] === 0xbf) {
+        bytes = bytes.subarray(3);
+    }
+    return sha256Hex(bytes);
+}
+
+// Posts the file as text chunks of about chunkBytes, keeping at most window
+// of them unacknowledged. Slices are decoded as one stream, so characters
+// split across a slice boundary come out whole.
+async function upload(file: File, chunkBytes: number, window: number) {
+    const current = ++generation;
+    wake();
+    const decoder = new TextDecoder();
+    acked = 0;
+    sent = 0;
+    let offset = 0;
+    do {
+        while (sent - acked >= window && current === generation) {
+            await new Promise<void>(resolve => {
+                wakeUpload = resolve;
+            });
+        }
+        const end = Math.min(offset + chunkBytes, file.size);
+        const bytes = new Uint8Array(await file.slice(offset, end).arrayBuffer());
+        if (current !== generation) return;
+        const final = end >= file.size;
+        const text = decoder.decode(bytes, { stream: !final });
+        post({ type: 'chunk', index: sent, text, final, bytes: end, total: file.size });
+        sent++;
+        offset = end;
+    } while (offset < file.size);
+}
+
+function wake() {
+    const resolve = wakeUpload;
+    wakeUpload = null;
+    resolve?.();
+}
+
+ctx.onmessage = (event: MessageEvent<CsvWorkerRequest>) => {
+    const request = event.data;
+    const fail = (task: 'preview' | 'hash' | 'upload') => (error: unknown) =>
+        post({ type: 'error', task, message: error instanceof Error ? error.message : String(error) });
+
+    switch (request.type) {
+        case 'preview':
+            preview(request.file, request.rows)
+                .then(result => post({ type: 'preview', preview: result }))
+                .catch(fail('preview'));
+            break;
+        case 'hash':
+            hash(request.file)
+                .then(result => post({ type: 'hash', hash: result }))
+                .catch(fail('hash'));
+            break;
+        case 'upload':
+            upload(request.file, request.chunkBytes, request.window).catch(fail('upload'));
+            break;
+        case 'ack':
+            acked++;
+            wake();
+            break;
+        case 'cancel':
+            generation++;
+            wake();
+            break;
+    }
+};
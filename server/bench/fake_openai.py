@@ -0,0 +1,270 @@
+"""
+Local stand-in for the OpenAI Assistants endpoints used by server.py.
+
+Every run follows a script of tool-call steps: after --latency seconds the run
+reports requires_action with the step's tool calls, and once outputs are
+submitted it moves to the next step. After the last step the run completes and
+an assistant message is added to the thread.
+
+Run from the server directory, then point the server at it:
+    python -m bench.fake_openai --port 8001 --latency 0.5
+    OPENAI_BASE_URL=http://localhost:8001/v1 python server.py
+
+--script takes a JSON file holding a list of steps, each a list of
+{"name": ..., "arguments": {...}} tool calls. The default script matches the
+columns produced by bench.tools.generate_csv.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, jsonify, request
+
+DEFAULT_SCRIPT = [
+    [
+        {"name": "getColumnInfo", "arguments": {"colName": "num_0"}},
+        {"name": "calculateMean", "arguments": {"colName": "num_0"}},
+    ],
+    [
+        {
+            "name": "histoToImage",
+            "arguments": {
+                "colName": "num_0",
+                "xaxis": "Value",
+                "yaxis": "Count",
+                "title": "Distribution",
+            },
+        }
+    ],
+]
+
+app = Flask(__name__)
+lock = threading.Lock()
+threads = {}
+runs = {}
+settings = {"script": DEFAULT_SCRIPT, "latency": 0.5, "jitter": 0.0}
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def step_latency() -> float:
+    return max(0.0, settings["latency"] + random.uniform(-1, 1) * settings["jitter"])
+
+
+def make_message(thread_id: str, role: str, text: str) -> dict:
+    return {
+        "id": new_id("msg"),
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "attachments": [],
+        "metadata": {},
+    }
+
+
+def run_view(run: dict) -> dict:
+    """Advances the run's scripted state based on the clock and returns it."""
+    if run["status"] in ("queued", "in_progress") and time.time() >= run["ready_at"]:
+        if run["step"] < len(settings["script"]):
+            calls = [
+                {
+                    "id": new_id("call"),
+                    "type": "function",
+                    "function": {
+                        "name": call["name"],
+                        "arguments": json.dumps(call["arguments"]),
+                    },
+                }
+                for call in settings["script"][run["step"]]
+            ]
+            run["status"] = "requires_action"
+            run["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": calls},
+            }
+        else:
+            run["status"] = "completed"
+            threads[run["thread_id"]].append(
+                make_message(run["thread_id"], "assistant", "Scripted analysis complete.")
+            )
+    elif run["status"] == "queued":
+        run["status"] = "in_progress"
+
+    return {
+        key: value for key, value in run.items() if key not in ("step", "ready_at")
+    }
+
+
+@app.post("/v1/assistants")
+def create_assistant():
+    body = request.get_json(silent=True) or {}
+    return jsonify(
+        {
+            "id": new_id("asst"),
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": body.get("name"),
+            "model": body.get("model", "gpt-4o"),
+            "instructions": body.get("instructions"),
+            "tools": body.get("tools", []),
+            "metadata": {},
+        }
+    )
+
+
+@app.post("/v1/threads")
+def create_thread():
+    thread_id = new_id("thread")
+    with lock:
+        threads[thread_id] = []
+    return jsonify(
+        {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+    )
+
+
+@app.post("/v1/threads/<thread_id>/messages")
+def create_message(thread_id):
+    body = request.get_json(silent=True) or {}
+    message = make_message(thread_id, body.get("role", "user"), str(body.get("content", "")))
+    with lock:
+        threads.setdefault(thread_id, []).append(message)
+    return jsonify(message)
+
+
+@app.get("/v1/threads/<thread_id>/messages")
+def list_messages(thread_id):
+    with lock:
+        data = list(threads.get(thread_id, []))
+    if request.args.get("order", "desc") == "desc":
+        data.reverse()
+    after = request.args.get("after")
+    if after:
+        ids = [message["id"] for message in data]
+        data = data[ids.index(after) + 1 :] if after in ids else []
+    limit = int(request.args.get("limit", 20))
+    page = data[:limit]
+    return jsonify(
+        {
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(data) > limit,
+        }
+    )
+
+
+@app.post("/v1/threads/<thread_id>/runs")
+def create_run(thread_id):
+    body = request.get_json(silent=True) or {}
+    run = {
+        "id": new_id("run"),
+        "object": "thread.run",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "assistant_id": body.get("assistant_id"),
+        "instructions": body.get("instructions"),
+        "truncation_strategy": body.get("truncation_strategy"),
+        "status": "queued",
+        "required_action": None,
+        "tools": [],
+        "metadata": {},
+        "step": 0,
+        "ready_at": time.time() + step_latency(),
+    }
+    with lock:
+        runs[run["id"]] = run
+        return jsonify(run_view(run))
+
+
+@app.get("/v1/threads/<thread_id>/runs/<run_id>")
+def retrieve_run(thread_id, run_id):
+    with lock:
+        run = runs.get(run_id)
+        if run is None:
+            return jsonify({"error": {"message": "No run found"}}), 404
+        return jsonify(run_view(run))
+
+
+@app.post("/v1/threads/<thread_id>/runs/<run_id>/submit_tool_outputs")
+def submit_tool_outputs(thread_id, run_id):
+    with lock:
+        run = runs.get(run_id)
+        if run is None or run["status"] != "requires_action":
+            return jsonify({"error": {"message": "Run is not waiting on tool outputs"}}), 400
+        run["step"] += 1
+        run["status"] = "in_progress"
+        run["required_action"] = None
+        run["ready_at"] = time.time() + step_latency()
+        return jsonify(run_view(run))
+
+
+
+@app.post("/v1/threads/<thread_id>/runs/<run_id>/cancel")
+def cancel_run(thread_id, run_id):
+    with lock:
+        run = runs.get(run_id)
+        if run is None:
+            return jsonify({"error": {"message": "No run found"}}), 404
+        if run["status"] not in ("queued", "in_progress", "requires_action"):
+            return jsonify({"error": {"message": f"Cannot cancel run with status '{run['status']}'"}}), 400
+        run["status"] = "cancelled"
+        run["required_action"] = None
+        return jsonify(run_view(run))
+
+
+
+@app.post("/v1/chat/completions")
+def chat_completion():
+    """Answers with a canned reply (used for thread summaries)."""
+    body = request.get_json(silent=True) or {}
+    prompt = str(body.get("messages", [{}])[-1].get("content", ""))
+    return jsonify(
+        {
+            "id": new_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": f"Scripted summary of {prompt.count(chr(10) * 2)} messages.",
+                    },
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI Assistants API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per run step")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to latency")
+    parser.add_argument("--script", help="JSON file with the tool-call steps of every run")
+    args = parser.parse_args()
+
+    settings["latency"] = args.latency
+    settings["jitter"] = args.jitter
+    if args.script:
+        with open(args.script) as f:
+            settings["script"] = json.load(f)
+
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
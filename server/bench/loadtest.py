@@ -0,0 +1,215 @@
+"""
+End-to-end load generator for server.py.
+
+Opens many concurrent Socket.IO clients, each doing
+set_api_key -> create_thread -> send_csv -> send_message (repeated --turns times),
+and reports throughput, turn latency percentiles and the server's CPU and
+memory use (scraped from its /metrics endpoint).
+
+Run against a server backed by the fake Assistants API (see bench.fake_openai):
+    python -m bench.loadtest --url http://localhost:5000 --sessions 200 --turns 3
+
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+import socketio
+
+from bench.tools import generate_csv
+
+
+def scrape_metrics(url: str) -> dict:
+    """Reads the unlabelled samples from the server's Prometheus endpoint."""
+    samples = {}
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            text = response.read().decode("utf-8")
+    except OSError as e:
+        print(f"Could not scrape metrics: {str(e)}", file=sys.stderr)
+        return samples
+
+    for line in text.splitlines():
+        if line.startswith("#") or "{" in line:
+            continue
+        parts = line.split()
+        if len(parts) == 2:
+            try:
+                samples[parts[0]] = float(parts[1])
+            except ValueError:
+                pass
+    return samples
+
+
+def percentile(values: list, pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_session(url: str, csv_text: str, turns: int, timeout: float, results: dict) -> None:
+    """One simulated user. Appends turn latencies and errors to results."""
+    sio = socketio.Client(reconnection=False)
+    events = {}
+    thread = {}
+
+    def waiter(name):
+        events[name] = threading.Event()
+        return events[name]
+
+    @sio.on("connection_status")
+    def on_status(data):
+        events["connection_status"].set()
+
+    @sio.on("thread_created")
+    def on_thread(data):
+        thread["id"] = data["thread_id"]
+        events["thread_created"].set()
+
+    @sio.on("message_received")
+    def on_message(data):
+        if "message_received" in events:
+            events["message_received"].set()
+
+    @sio.on("error")
+    def on_error(data):
+        with results["lock"]:
+            results["errors"].append(str(data.get("msg")))
+
+    def wait(event, what):
+        if not event.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for {what}")
+
+    try:
+        sio.connect(url, transports=["websocket"])
+
+        ready = waiter("connection_status")
+        sio.emit("set_api_key", "sk-load-test")
+        wait(ready, "connection_status")
+
+        created = waiter("thread_created")
+        sio.emit("create_thread")
+        wait(created, "thread_created")
+        sio.emit("join_thread", {"thread_id": thread["id"]})
+
+        started = time.perf_counter()
+        received = waiter("message_received")
+        sio.emit("send_csv", {"thread_id": thread["id"], "csvContent": csv_text})
+        wait(received, "initial analysis")
+        with results["lock"]:
+            results["upload_latencies"].append(time.perf_counter() - started)
+
+        for turn in range(turns):
+            started = time.perf_counter()
+            received = waiter("message_received")
+            sio.emit(
+                "send_message",
+                {"thread_id": thread["id"], "message": f"Load test question {turn}"},
+            )
+            wait(received, "message_received")
+            with results["lock"]:
+                results["turn_latencies"].append(time.perf_counter() - started)
+    except Exception as e:
+        with results["lock"]:
+            results["errors"].append(str(e))
+    finally:
+        if sio.connected:
+            sio.disconnect()
+
+
+def sample_rss(url: str, stop: threading.Event, interval: float, peaks: dict) -> None:
+    while not stop.wait(interval):
+        rss = scrape_metrics(url).get("process_resident_memory_bytes")
+        if rss is not None:
+            peaks["rss"] = max(peaks.get("rss", 0), rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO load generator for server.py")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--turns", type=int, default=3, help="send_message turns per client")
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows in the uploaded CSV")
+    parser.add_argument("--cols", type=int, default=8, help="Columns in the uploaded CSV")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which clients start")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-step timeout in seconds")
+    parser.add_argument("--out", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    csv_text = generate_csv(args.rows, args.cols)
+    results = {"lock": threading.Lock(), "turn_latencies": [], "upload_latencies": [], "errors": []}
+
+    before = scrape_metrics(args.url)
+    peaks = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_rss, args=(args.url, stop, 1.0, peaks), daemon=True)
+    sampler.start()
+
+    started = time.perf_counter()
+    workers = []
+    for i in range(args.sessions):
+        worker = threading.Thread(
+            target=run_session,
+            args=(args.url, csv_text, args.turns, args.timeout, results),
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+        if args.sessions > 1:
+            time.sleep(args.ramp / args.sessions)
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    after = scrape_metrics(args.url)
+
+    turns = results["turn_latencies"]
+    uploads = results["upload_latencies"]
+    cpu_seconds = None
+    if "process_cpu_seconds_total" in before and "process_cpu_seconds_total" in after:
+        cpu_seconds = after["process_cpu_seconds_total"] - before["process_cpu_seconds_total"]
+
+    report = {
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "csv_rows": args.rows,
+        "csv_cols": args.cols,
+        "elapsed_s": elapsed,
+        "completed_turns": len(turns),
+        "throughput_turns_per_s": len(turns) / elapsed if elapsed else None,
+        "turn_latency_s": {
+            "p50": percentile(turns, 50),
+            "p99": percentile(turns, 99),
+            "mean": statistics.fmean(turns) if turns else None,
+            "max": max(turns) if turns else None,
+        },
+        "upload_latency_s": {"p50": percentile(uploads, 50), "p99": percentile(uploads, 99)},
+        "server": {
+            "cpu_seconds": cpu_seconds,
+            "cpu_utilization": cpu_seconds / elapsed if cpu_seconds is not None else None,
+            "rss_bytes_start": before.get("process_resident_memory_bytes"),
+            "rss_bytes_peak": peaks.get("rss", after.get("process_resident_memory_bytes")),
+            "rss_bytes_end": after.get("process_resident_memory_bytes"),
+        },
+        "errors": len(results["errors"]),
+        "error_samples": sorted(set(results["errors"]))[:10],
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
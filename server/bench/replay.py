@@ -0,0 +1,176 @@
+"""
+Replays recorded tool-call traces directly against functioncalls.py.
+
+Record on the server with DATADAVE_RECORD_PATH=runs.jsonl, collect the CSVs the
+users analyzed, then run from the server directory:
+    python -m bench.replay runs.jsonl --datasets exports/ --out after.json
+    python -m bench.replay runs.jsonl --datasets exports/ --concurrency 4 --compare before.json
+
+Datasets are matched to recorded runs by content hash, so file names don't
+matter. With --concurrency > 1 runs are spread over worker processes (each
+with its own copy of the tool state); otherwise they replay serially.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from datastore import hash_csv
+
+
+def load_runs(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def index_datasets(paths: list) -> dict:
+    """Maps content hash -> CSV file path for every CSV under the given paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.lower().endswith(".csv")
+            )
+        else:
+            files.append(path)
+
+    index = {}
+    for file in files:
+        with open(file, encoding="utf-8", newline="") as f:
+            index[hash_csv(f.read())] = file
+    return index
+
+
+def replay_runs(runs: list, dataset_files: dict) -> list:
+    """Replays runs in this process. Returns one timing entry per tool call."""
+    import functioncalls
+    from datastore import datasets, store_dataset, get_frame
+    from functioncalls import function_map, setcsv
+
+    # Charts are emitted over the socket in the server; discard them here
+    functioncalls.emit = lambda *a, **kw: None
+
+    timings = []
+    loaded = None
+    with contextlib.redirect_stdout(sys.stderr):
+        for run in runs:
+            if run["dataset"] != loaded:
+                # Parse each dataset once, as the server does
+                datasets.pop(loaded, None)
+                with open(dataset_files[run["dataset"]], encoding="utf-8", newline="") as f:
+                    csv_text = f.read()
+                # Older recordings lack these: the server's defaults then
+                store_dataset(
+                    run["dataset"], csv_text, [], [], run.get("dtypes"), run.get("delimiter", ",")
+                )
+                get_frame(run["dataset"])
+                setcsv(csv_text, run["dataset"])
+                loaded = run["dataset"]
+
+            for call in run["calls"]:
+                entry = {"run_id": run["run_id"], "tool": call["name"]}
+                started = time.perf_counter()
+                try:
+                    if call["name"] not in function_map:
+                        raise KeyError(f"Function {call['name']} not implemented")
+                    function_map[call["name"]](**call["arguments"])
+                except Exception as e:
+                    entry["error"] = str(e)
+                entry["seconds"] = time.perf_counter() - started
+                timings.append(entry)
+    return timings
+
+
+def summarize(timings: list) -> dict:
+    by_tool = {}
+    for entry in timings:
+        by_tool.setdefault(entry["tool"], []).append(entry)
+
+    summary = {}
+    for tool, entries in sorted(by_tool.items()):
+        seconds = sorted(e["seconds"] for e in entries)
+        summary[tool] = {
+            "calls": len(entries),
+            "errors": sum(1 for e in entries if "error" in e),
+            "total_s": sum(seconds),
+            "median_s": statistics.median(seconds),
+            "p99_s": seconds[min(len(seconds) - 1, int(round(0.99 * (len(seconds) - 1))))],
+        }
+    return summary
+
+
+def compare(summary: dict, baseline_path: str) -> dict:
+    """Per-tool ratio of median time against a previous replay report."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["tools"]
+    return {
+        tool: stats["median_s"] / baseline[tool]["median_s"]
+        for tool, stats in summary.items()
+        if tool in baseline and baseline[tool]["median_s"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded tool-call traces")
+    parser.add_argument("traces", help="JSONL file written via DATADAVE_RECORD_PATH")
+    parser.add_argument("--datasets", nargs="+", required=True, help="CSV files or directories")
+    parser.add_argument("--concurrency", type=int, default=1, help="Worker processes")
+    parser.add_argument("--compare", help="Earlier replay report to compare medians against")
+    parser.add_argument("--out", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    runs = load_runs(args.traces)
+    dataset_files = index_datasets(args.datasets)
+    playable = [run for run in runs if run.get("dataset") in dataset_files]
+    skipped = len(runs) - len(playable)
+    if skipped:
+        print(f"Skipping {skipped} runs whose dataset was not provided", file=sys.stderr)
+
+    started = time.perf_counter()
+    if args.concurrency > 1:
+        # Keep each dataset's runs together so each worker loads it once
+        groups = {}
+        for run in playable:
+            groups.setdefault(run["dataset"], []).append(run)
+        chunks = [[] for _ in range(args.concurrency)]
+        for group in sorted(groups.values(), key=len, reverse=True):
+            min(chunks, key=len).extend(group)
+        with ProcessPoolExecutor(max_workers=args.concurrency) as pool:
+            timings = [
+                entry
+                for chunk_timings in pool.map(replay_runs, chunks, [dataset_files] * len(chunks))
+                for entry in chunk_timings
+            ]
+    else:
+        timings = replay_runs(playable, dataset_files)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "runs": len(playable),
+        "skipped_runs": skipped,
+        "tool_calls": len(timings),
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "tools": summarize(timings),
+    }
+    if args.compare:
+        report["median_ratio_vs_baseline"] = compare(report["tools"], args.compare)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Benchmarks every tool in functioncalls.function_map against synthetic CSVs.
+
+Run from the server directory:
+    python -m bench.tools --preset quick --out bench.json
+    python -m bench.tools --rows 1000 1000000 --cols 5 50 --tools calculateMean histoToImage
+
+Results are printed (or written with --out) as JSON, one entry per
+(dataset shape, tool) with timing percentiles and peak traced memory.
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import functioncalls
+from datastore import hash_csv, store_dataset, get_frame
+from functioncalls import (
+    function_map,
+    setcsv,
+    getFirstRowFromCSV,
+    getFirstDataRowFromCSV,
+)
+
+PRESETS = {
+    "quick": {"rows": [1_000, 100_000], "cols": [5, 50]},
+    "full": {"rows": [1_000, 100_000, 1_000_000, 10_000_000], "cols": [5, 50, 500]},
+}
+
+CATEGORIES = [f"cat_{i}" for i in range(20)]
+
+DESCRIBE_ALL = [
+    "dtype", "count", "missing", "unique", "mean", "std", "min", "p5", "median", "p95", "max", "top",
+]
+
+
+def generate_csv(rows: int, cols: int, null_fraction: float = 0.7, seed: int = 0) -> str:
+    """
+    Builds a CSV with a leading ISO timestamp column followed by a repeating
+    mix of column kinds: float, integer, categorical and null-heavy float
+    (null_fraction of values missing).
+    """
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 2 * 365 * 24 * 3600, rows)
+    columns = {
+        "timestamp": (np.datetime64("2023-01-01T00:00:00") + seconds.astype("timedelta64[s]")).astype(str)
+    }
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            columns[f"num_{i}"] = rng.normal(100, 15, rows).round(3)
+        elif kind == 1:
+            columns[f"int_{i}"] = rng.integers(0, 1000, rows)
+        elif kind == 2:
+            columns[f"cat_{i}"] = rng.choice(CATEGORIES, rows)
+        else:
+            values = rng.normal(0, 1, rows).round(3)
+            values[rng.random(rows) < null_fraction] = np.nan
+            columns[f"sparse_{i}"] = values
+    return pd.DataFrame(columns).to_csv(index=False)
+
+
+def tool_arguments(columns: list) -> dict:
+    """Representative arguments for each tool, chosen from the generated columns."""
+    numeric = [c for c in columns if c.startswith("num_")]
+    integer = [c for c in columns if c.startswith("int_")] or numeric
+    categorical = [c for c in columns if c.startswith("cat_")] or columns
+    num = numeric[0]
+    num2 = (numeric[1:] or integer)[0]
+    cat = categorical[0]
+    number_list = [str(x) for x in np.random.default_rng(1).normal(0, 1, 1000).round(3)]
+    category_list = list(np.random.default_rng(1).choice(CATEGORIES, 1000))
+    chart = {"xaxis": "x", "yaxis": "y", "title": "Benchmark"}
+
+    return {
+        "calculateMean": {"colName": num},
+        "calculateMedian": {"colName": num},
+        "calculateMode": {"colName": integer[0]},
+        "calculateVariance": {"colName": num},
+        "calculateStandardDeviation": {"colName": num},
+        "countRows": {},
+        "getColumnInfo": {"colName": num},
+        "searchValue": {"query": "cat_3"},
+        "searchRowDetails": {"colName": cat, "query": "cat_3"},
+        "bargraphToImage": {"colName": cat, **chart},
+        "histoToImage": {"colName": num, **chart, "normal_dist": True},
+        "colNameToPiechart": {"colName": cat, "title": "Benchmark"},
+        "get_filtered_results_from_string": {
+            "query_param": cat,
+            "query_value": "cat_3",
+            "target_param": num,
+        },
+        "listToPiechart": {"valSet": category_list, "title": "Benchmark"},
+        "correlationAnalysis": {"col1": num, "col2": num2, "title": "Benchmark"},
+        "calculateMeanfromList": {"data": number_list},
+        "calculateMedianfromList": {"data": number_list},
+        "calculateModefromList": {"data": number_list},
+        "calculateVariancefromList": {"data": number_list},
+        "calculateStandardDeviationfromList": {"data": number_list},
+        "bargraphToImagefromList": {"data": category_list, **chart},
+        "groupByAggregate": {
+            "groupBy": [cat],
+            "valueCol": num,
+            "aggregations": ["mean", "sum", "count", "min", "max", "median", "std"],
+            "chart": True,
+        },
+        "describeColumns": {"stats": DESCRIBE_ALL},
+        "timeSeries": {
+            "dateCol": "timestamp",
+            "valueCol": num,
+            "freq": "week",
+            "aggregation": "sum",
+            "rolling": 4,
+            "cumulative": True,
+        },
+        "correlationMatrix": {},
+        "findColumns": {"pattern": "num_*"},
+        "runQuery": {
+            "sql": f'SELECT "{cat}", AVG("{num}") AS avg_value, COUNT(*) AS n FROM data '
+            f'WHERE "{num}" > 90 GROUP BY 1 ORDER BY avg_value DESC LIMIT 10'
+        },
+    }
+
+
+def time_call(fn, kwargs: dict, repeat: int) -> dict:
+    """Times repeat calls, then one more call under tracemalloc for peak memory."""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(**kwargs)
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn(**kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "mean_s": statistics.fmean(durations),
+        "max_s": max(durations),
+        "peak_traced_bytes": peak,
+        "result_preview": str(result)[:120],
+    }
+
+
+def run_shape(rows: int, cols: int, tools: list, repeat: int, null_fraction: float) -> list:
+    print(f"Generating {rows} rows x {cols} columns", file=sys.stderr)
+    csv_text = generate_csv(rows, cols, null_fraction)
+    shape = {"rows": rows, "cols": cols, "csv_bytes": len(csv_text)}
+
+    # Same path as an upload: hash, store, parse once, point the tools at it
+    started = time.perf_counter()
+    digest = hash_csv(csv_text)
+    headers = getFirstRowFromCSV(csv_text)
+    store_dataset(digest, csv_text, headers, getFirstDataRowFromCSV(csv_text))
+    get_frame(digest)
+    setcsv(csv_text, digest)
+    results = [
+        {**shape, "tool": "ingest", "min_s": time.perf_counter() - started}
+    ]
+
+    arguments = tool_arguments(headers)
+    for name in tools:
+        if name not in arguments:
+            results.append({**shape, "tool": name, "skipped": "no benchmark arguments"})
+            continue
+        print(f"  {name}", file=sys.stderr)
+        try:
+            timing = time_call(function_map[name], arguments[name], repeat)
+        except Exception as e:
+            timing = {"error": str(e)}
+        results.append({**shape, "tool": name, **timing})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--preset", choices=PRESETS, default="quick")
+    parser.add_argument("--rows", type=int, nargs="+", help="Row counts (overrides preset)")
+    parser.add_argument("--cols", type=int, nargs="+", help="Column counts (overrides preset)")
+    parser.add_argument("--tools", nargs="+", default=list(function_map), help="Tools to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--null-fraction", type=float, default=0.7)
+    parser.add_argument("--out", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.tools if name not in function_map]
+    if unknown:
+        parser.error(f"Unknown tools: {', '.join(unknown)}")
+
+    # Charts are emitted over the socket in the server; discard them here
+    functioncalls.emit = lambda *a, **kw: None
+
+    # The tools log with print(); keep stdout for the JSON report
+    results = []
+    with contextlib.redirect_stdout(sys.stderr):
+        for rows in args.rows or PRESETS[args.preset]["rows"]:
+            for cols in args.cols or PRESETS[args.preset]["cols"]:
+                results.extend(
+                    run_shape(rows, cols, args.tools, args.repeat, args.null_fraction)
+                )
+
+    report = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import hashlib
+import threading
+
+from metrics import CSV_PARSE_SECONDS
+
+
+# Content-addressed store of uploaded datasets, keyed by SHA-256 of the CSV text.
+# Each dataset is stored once and shared (read-only) by every thread that uses it.
+datasets = {}
+
+# Datasets each thread references, by name: {thread_id: {name: digest}}
+thread_refs = {}
+
+# Name of the dataset each thread's tools currently work on
+active_names = {}
+
+# Name given to an upload that doesn't name its dataset
+DEFAULT_DATASET = "main"
+
+# Functions that fold appended rows into a derived value (see get_derived),
+# by the first element of its key. Called as updater(key, value, added, offset)
+# with the parsed new rows and the row count before them; they return the
+# updated value, or None to drop it and recompute on next use.
+derived_updaters = {}
+
+
+def hash_csv(csv_content: str) -> str:
+    """Return the hex SHA-256 digest of the CSV text (UTF-8 encoded)."""
+    return csv_hasher(csv_content).hexdigest()
+
+
+def csv_hasher(csv_content: str):
+    """
+    A SHA-256 object fed with the CSV text, whose digest is hash_csv's. Kept
+    as a dataset's "hasher" so appends can continue it (see append_dataset).
+    """
+    return hashlib.sha256(csv_content.encode("utf-8"))
+
+
+def has_dataset(digest: str) -> bool:
+    return digest in datasets
+
+
+def get_dataset(digest: str) -> dict | None:
+    return datasets.get(digest)
+
+
+def store_dataset(
+    digest: str,
+    csv_content: str,
+    headers: list,
+    data_row: list,
+    dtypes: dict = None,
+    delimiter: str = ",",
+) -> str:
+    """
+    Stores a dataset under its content hash (see hash_csv) and returns the hash.
+    If an identical dataset is already stored, the existing copy (and the
+    dtype overrides it was first stored with) is kept.
+    """
+    if digest not in datasets:
+        datasets[digest] = {
+            "digest": digest,
+            "csv_data": csv_content,
+            "headers": headers,
+            "data_row": data_row,
+            "nbytes": len(csv_content.encode("utf-8")),
+            "refs": set(),
+            "dtypes": dtypes or {},
+            "delimiter": delimiter,
+            "frame": None,
+            "derived": {},
+            "lock": threading.Lock(),
+        }
+        print(f"Stored dataset {digest[:12]} ({datasets[digest]['nbytes']} bytes)")
+    return digest
+
+
+def store_frame(frame) -> str:
+    """
+    Stores a DataFrame computed on the server (e.g. a join result) as a dataset
+    and returns its hash. CSV text is generated so the dataset is content
+    addressed like an upload; the given frame is kept as its parsed form.
+    """
+    import pandas as pd
+
+    csv_content = frame.to_csv(index=False)
+    digest = hash_csv(csv_content)
+    if digest not in datasets:
+        data_row = [] if frame.empty else ["" if pd.isna(v) else str(v) for v in frame.iloc[0]]
+        store_dataset(digest, csv_content, [str(c) for c in frame.columns], data_row)
+        datasets[digest]["frame"] = frame
+    return digest
+
+
+def get_frame(digest: str):
+    """
+    Returns the dataset parsed into a DataFrame, parsing it (or loading its
+    snapshot) on first use. The frame is shared by every thread using the
+    dataset and must not be modified.
+    """
+    entry = datasets[digest]
+    if entry["frame"] is None:
+        with entry["lock"]:
+            loader = entry.pop("load_frame", None)
+            if entry["frame"] is None and loader is not None:
+                # e.g. a snapshot written before a restart (see snapshots.py)
+                entry["frame"] = loader()
+            if entry["frame"] is None:
+                from ingest import read_csv
+
+                cleaned_csv_string = entry["csv_data"].rstrip(",")  # Remove trailing comma
+                with CSV_PARSE_SECONDS.time():
+                    entry["frame"] = read_csv(
+                        cleaned_csv_string.replace("\\n", "\n"),
+                        dtypes=entry["dtypes"],
+                        delimiter=entry["delimiter"],
+                    )
+    return entry["frame"]
+
+
+def get_derived(digest: str, key: tuple, compute):
+    """
+    Returns a value computed from the dataset's frame by compute(frame),
+    running compute only the first time key is requested. Like the frame,
+    the result is shared and must not be modified.
+    """
+    frame = get_frame(digest)
+    derived = datasets[digest]["derived"]
+    if key not in derived:
+        derived[key] = compute(frame)
+    return derived[key]
+
+
+def peek_derived(digest: str, key: tuple):
+    """Returns a value already computed by get_derived, or None."""
+    entry = datasets.get(digest)
+    return entry["derived"].get(key) if entry else None
+
+
+def set_derived(digest: str, key: tuple, value) -> None:
+    """Caches a value computed without the parsed frame, for peek_derived to return."""
+    entry = datasets.get(digest)
+    if entry is not None:
+        entry["derived"][key] = value
+
+
+def append_dataset(digest: str, rows_text: str) -> tuple:
+    """
+    Appends CSV rows (with or without the header line) to a stored dataset.
+    The result is stored as a new dataset under the hash of the combined
+    text; the original stays for threads still using it. Only the new rows
+    are parsed and hashed: the frame is extended and derived values are
+    updated through derived_updaters. The combined text and frame are still
+    copies of the whole dataset. Returns (new digest, rows added).
+    """
+    import pandas as pd
+    from ingest import read_csv
+
+    entry = datasets[digest]
+    frame = get_frame(digest)
+    old_text = entry["csv_data"]
+    header_end = old_text.find("\n")
+    header = (old_text if header_end < 0 else old_text[:header_end]).rstrip("\r")
+
+    rows_text = rows_text.lstrip("\ufeff")
+    if rows_text.split("\n", 1)[0].rstrip("\r") == header:
+        rows_text = rows_text.split("\n", 1)[1] if "\n" in rows_text else ""
+    if not rows_text.strip():
+        raise ValueError("No rows to append")
+
+    cleaned_rows = rows_text.rstrip(",").replace("\\n", "\n")  # as get_frame cleans uploads
+    # Keep text, category and date columns typed as before; numbers are inferred
+    # (an int column may become float if the new rows have gaps)
+    keep_types = {
+        column: {"datetime64[ns]": "datetime"}.get(str(dtype), str(dtype))
+        for column, dtype in frame.dtypes.items()
+        if str(dtype) in ("object", "category", "datetime64[ns]")
+    }
+    added = read_csv(
+        header + "\n" + cleaned_rows,
+        dtypes={**keep_types, **entry["dtypes"]},
+        delimiter=entry["delimiter"],
+    )
+    if list(added.columns) != list(frame.columns):
+        raise ValueError(
+            f"Appended rows have columns {list(added.columns)}, expected {list(frame.columns)}"
+        )
+
+    # Continue the SHA-256 of the original text instead of rehashing it all
+    # (datasets restored from a snapshot have no hasher and are hashed once in full)
+    separator = "" if old_text.endswith("\n") else "\n"
+    hasher = entry.get("hasher") or csv_hasher(old_text)
+    hasher = hasher.copy()
+    hasher.update((separator + rows_text).encode("utf-8"))
+    new_digest = hasher.hexdigest()
+    if new_digest in datasets:
+        datasets[new_digest].setdefault("hasher", hasher)
+        return new_digest, len(added)
+
+    store_dataset(
+        new_digest,
+        old_text + separator + rows_text,
+        entry["headers"],
+        entry["data_row"],
+        entry["dtypes"],
+        entry["delimiter"],
+    )
+    new_entry = datasets[new_digest]
+    new_entry["hasher"] = hasher
+    combined = pd.concat([frame, added], ignore_index=True)
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            # concat falls back to object when the category sets differ
+            combined[column] = pd.api.types.union_categoricals(
+                [frame[column], added[column]], ignore_order=True
+            )
+    new_entry["frame"] = combined
+    for key, value in list(entry["derived"].items()):
+        updater = derived_updaters.get(key[0])
+        if updater is None:
+            continue
+        updated = updater(key, value, added, len(frame))
+        if updated is not None:
+            new_entry["derived"][key] = updated
+    return new_digest, len(added)
+
+
+def preload_frame(digest: str) -> None:
+    """Parses a dataset in a background thread so it is ready before the first tool call."""
+
+    def parse():
+        try:
+            get_frame(digest)
+        except Exception as e:
+            print(f"Error parsing dataset {digest[:12]}: {str(e)}")
+
+    threading.Thread(target=parse, daemon=True).start()
+
+
+def attach_dataset(thread_id: str, digest: str, name: str = DEFAULT_DATASET) -> dict:
+    """
+    Stores a dataset in a thread under name (releasing whatever that name
+    referenced before) and makes it the thread's active dataset.
+    Returns the dataset entry.
+    """
+    if digest not in datasets:
+        raise KeyError(f"Dataset {digest} not found")
+
+    names = thread_refs.setdefault(thread_id, {})
+    if names.get(name) != digest:
+        release_dataset(thread_id, name)
+        datasets[digest]["refs"].add((thread_id, name))
+        names[name] = digest
+    active_names[thread_id] = name
+    return datasets[digest]
+
+
+def activate_dataset(thread_id: str, name: str) -> dict:
+    """Makes one of the thread's named datasets the active one. Returns its entry."""
+    digest = thread_refs.get(thread_id, {}).get(name)
+    if digest is None or digest not in datasets:
+        raise KeyError(f"Dataset '{name}' not found")
+    active_names[thread_id] = name
+    return datasets[digest]
+
+
+def active_dataset(thread_id: str) -> tuple:
+    """(name, entry) of the thread's active dataset, or (None, None)."""
+    name = active_names.get(thread_id)
+    digest = thread_refs.get(thread_id, {}).get(name)
+    if digest is None or digest not in datasets:
+        return None, None
+    return name, datasets[digest]
+
+
+def thread_datasets(thread_id: str) -> dict:
+    """The thread's datasets as {name: digest}."""
+    return dict(thread_refs.get(thread_id, {}))
+
+
+def release_dataset(thread_id: str, name: str) -> None:
+    """Drops one named reference; datasets with no remaining references are freed."""
+    digest = thread_refs.get(thread_id, {}).pop(name, None)
+    if digest is None or digest not in datasets:
+        return
+
+    entry = datasets[digest]
+    entry["refs"].discard((thread_id, name))
+    if not entry["refs"]:
+        del datasets[digest]
+        print(f"Released dataset {digest[:12]}")
+
+
+def release_thread(thread_id: str) -> None:
+    """Drops all of a thread's datasets."""
+    for name in list(thread_refs.get(thread_id, {})):
+        release_dataset(thread_id, name)
+    thread_refs.pop(thread_id, None)
+    active_names.pop(thread_id, None)
+
+
+def resident_bytes() -> int:
+    """Total size of the CSV text and parsed frames held by the store."""
+    total = 0
+    for entry in list(datasets.values()):
+        total += entry["nbytes"]
+        if entry["frame"] is not None:
+            total += int(entry["frame"].memory_usage(index=True, deep=False).sum())
+    return total
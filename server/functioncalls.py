@@ -1,26 +1,185 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import io
-from collections import Counter
+import os
+import re
+import base64
+import contextlib
+import contextvars
+import fnmatch
+import threading
+import time
+import warnings
+import secrets
+from collections import Counter, OrderedDict
 from matplotlib.ticker import FuncFormatter
+from flask_socketio import emit
 import pandas as pd
 import matplotlib
+from metrics import CSV_PARSE_SECONDS, CHART_ENCODE_SECONDS
+from tracing import span
+from datastore import (
+    get_frame,
+    get_derived,
+    peek_derived,
+    set_derived,
+    get_dataset,
+    derived_updaters,
+    attach_dataset,
+    activate_dataset,
+    active_dataset,
+    thread_datasets,
+    store_frame,
+)
+import snapshots
+from ingest import read_csv, sniff_csv, sample_dtypes, looks_like_dates
 
 matplotlib.use("Agg")  # Set the backend to non-interactive mode
 
 
-csv = ""
+# The dataset tool calls work on, as (CSV text, dataset digest, thread id).
+# The server sets it for each call from the thread's active dataset when the
+# call is submitted, so a call waiting in the scheduler's queue still runs on
+# its own session's data whatever other sessions switch to meanwhile.
+tool_dataset = contextvars.ContextVar("tool_dataset", default=("", None, None))
 
 
-def setcsv(inputcsv: str) -> str:
-    global csv
+def setcsv(inputcsv: str, digest: str = None, thread_id: str = None) -> str:
+    """
+    Sets the CSV the tools work on in the current context. digest is the
+    dataset's key in the datastore; when given, the parsed frame is shared
+    from there. thread_id is the chat thread whose named datasets the
+    dataset tools manage.
+    """
     print(f"Setting CSV data, length: {len(inputcsv)}")
-    csv = inputcsv
+    tool_dataset.set((inputcsv, digest, thread_id))
     return "CSV data stored"
 
 
+def currentCsv() -> str:
+    return tool_dataset.get()[0]
+
+
+def currentDigest() -> str | None:
+    return tool_dataset.get()[1]
+
+
+def currentThread() -> str | None:
+    return tool_dataset.get()[2]
+
+
+def loadDataFrame(csv_string: str, **read_csv_args) -> pd.DataFrame:
+    """
+    Parses CSV text into a DataFrame, recording the parse time. The current
+    dataset is parsed once and then served from the datastore, so callers
+    must treat the returned frame as read-only.
+    """
+    csv, csv_digest, _ = tool_dataset.get()
+    checkCancelled()
+    if csv_digest is not None and csv_string is csv and not read_csv_args:
+        with span("dataset_frame"):
+            return get_frame(csv_digest)
+
+    cleaned_csv_string = csv_string.rstrip(",")  # Remove trailing comma
+    cleaned_csv_string = cleaned_csv_string.replace("\\n", "\n")
+    with span("csv_parse", chars=len(csv_string)), CSV_PARSE_SECONDS.time():
+        if read_csv_args:
+            return pd.read_csv(io.StringIO(cleaned_csv_string), **read_csv_args)
+        return read_csv(cleaned_csv_string)
+
+
+def derivedValue(df: pd.DataFrame, key: tuple, compute):
+    """
+    compute(df), cached on the dataset when df is the current dataset's
+    shared frame (see datastore.get_derived); computed directly otherwise.
+    """
+    csv_digest = currentDigest()
+    if csv_digest is not None and df is get_frame(csv_digest):
+        return get_derived(csv_digest, key, compute)
+    return compute(df)
+
+
+# pyplot keeps one current figure for the whole process, and tools run on
+# several worker threads: charts are drawn one at a time under this lock
+chart_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def chartFigure(**figure_args):
+    """
+    Opens a pyplot figure for one chart, holding chart_lock until it is
+    drawn, encoded and closed.
+    """
+    with chart_lock:
+        figure = plt.figure(**figure_args)
+        try:
+            yield figure
+        finally:
+            plt.close(figure)
+
+
+def figureToPNG() -> bytes:
+    """Renders the current Matplotlib figure to PNG bytes, recording the encode time."""
+    checkCancelled()
+    with span("chart_encode") as encode_span, CHART_ENCODE_SECONDS.time():
+        buf = io.BytesIO()
+        plt.savefig(buf, format="png")
+        data = buf.getvalue()
+        buf.close()
+        encode_span["png_bytes"] = len(data)
+    return data
+
+
+def figureToBase64() -> str:
+    return base64.b64encode(figureToPNG()).decode("utf-8")
+
+
+# Set by the server around each tool call. While pending_emits holds a list,
+# socket events from tool code are queued there and sent by the server's
+# handler (tools run on worker threads without a socket context).
+# tool_cancel holds a threading.Event that is set when the call is cancelled
+# or runs out of time; long-running tools check it via checkCancelled.
+pending_emits = contextvars.ContextVar("pending_emits", default=None)
+tool_cancel = contextvars.ContextVar("tool_cancel", default=None)
+
+# Cleared by tools whose result can't be served again from the result cache
+# (see resultcache.py), such as a first page whose cursor will move on
+result_cacheable = contextvars.ContextVar("result_cacheable", default=True)
+
+
+# A BaseException, so the tools' own "except Exception" handlers don't turn a
+# cancelled call into an (empty or partial) result that could be cached
+class ToolCancelled(BaseException):
+    pass
+
+
+def checkCancelled() -> None:
+    """Raises ToolCancelled if the current tool call was cancelled or timed out."""
+    cancel = tool_cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise ToolCancelled("Tool call was cancelled")
+
+
+def emitEvent(event: str, payload: dict, **kwargs) -> None:
+    """Emits a socket event, or queues it while a tool call is being run by the server."""
+    queue = pending_emits.get()
+    if queue is None:
+        emit(event, payload, **kwargs)
+    else:
+        queue.append((event, payload, kwargs))
+
+
+def emitImage(encoded_image: str) -> None:
+    """Sends a base64-encoded PNG to all connected clients."""
+    emitEvent(
+        "image_received",
+        {"image_data": encoded_image, "format": "png"},
+        broadcast=True,
+    )
+
+
 def calculateMean(colName: str, exclude_outliers: bool = False) -> float | str:
-    data = getColumnFromCSV(csv, colName)
+    data = getColumnFromCSV(currentCsv(), colName)
     try:
         numeric_data = [float(x) for x in data]
         if exclude_outliers:
@@ -55,7 +214,7 @@ def calculateMeanfromList(data: list, exclude_outliers: bool = False) -> float |
         return f"Error: List contains non-numeric values"
 
 def calculateMedian(colName: str) -> float | str:
-    data = getColumnFromCSV(csv, colName)
+    data = getColumnFromCSV(currentCsv(), colName)
     try:
         numeric_data = [float(x) for x in data]
         numeric_data.sort()
@@ -84,7 +243,7 @@ def calculateMedianfromList(data: list) -> float | str:
         return f"Error: List contains non-numeric values"
 
 def calculateMode(colName: str) -> str:
-    data = getColumnFromCSV(csv, colName)
+    data = getColumnFromCSV(currentCsv(), colName)
     # First check if all values can be converted to float
     if not all(isinstance(x, (int, float)) or (isinstance(x, str) and x.replace('.', '').isdigit()) for x in data):
         return f"Error: Column '{colName}' contains non-numeric values"
@@ -131,7 +290,7 @@ def calculateModefromList(data: list) -> str:
         return f"Error: List contains non-numeric values"
 
 def calculateVariance(colName: str) -> float | str:
-    data = getColumnFromCSV(csv, colName)
+    data = getColumnFromCSV(currentCsv(), colName)
     try:
         numeric_data = [float(x) for x in data]
         mean = sum(numeric_data) / len(numeric_data)
@@ -148,7 +307,7 @@ def calculateVariancefromList(data: list) -> float | str:
         return f"Error: List contains non-numeric values"
 
 def calculateStandardDeviation(colName: str) -> float | str:
-    data = getColumnFromCSV(csv, colName)
+    data = getColumnFromCSV(currentCsv(), colName)
     try:
         variance = calculateVariance(colName)
         return variance**0.5
@@ -173,6 +332,71 @@ def graphDisplay(data: list) -> str:
     return "Graph displayed"
 
 
+def finiteSorted(column: pd.Series) -> np.ndarray:
+    values = column.to_numpy(dtype=float, na_value=np.nan)
+    values = values[np.isfinite(values)]
+    values.sort()
+    return values
+
+
+def sortedValues(df: pd.DataFrame, colName: str) -> np.ndarray:
+    """The column's finite values as a sorted float array, cached per dataset."""
+    return derivedValue(df, ("sorted_values", colName), lambda frame: finiteSorted(frame[colName]))
+
+
+def binCounts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """np.histogram counts of sorted values for the given edges, by binary search."""
+    positions = np.searchsorted(values, edges, side="left")
+    positions[-1] = np.searchsorted(values, edges[-1], side="right")  # last bin is closed
+    return np.diff(positions)
+
+
+def updateSortedValues(key, values, added, offset):
+    # Both runs are sorted, so the stable sort only merges them
+    return np.sort(np.concatenate([values, finiteSorted(added[key[1]])]), kind="stable")
+
+
+def updateHistogram(key, value, added, offset):
+    if key[3] is None:
+        # Edges follow the data's min and max; rebinning the updated sorted
+        # values on next use costs only O(bins log n)
+        return None
+    counts, edges = value
+    return counts + binCounts(finiteSorted(added[key[1]]), edges), edges
+
+
+def updateMoments(key, value, added, offset):
+    # Chan et al. pairwise update of mean and variance
+    mean, std, count = value
+    new_values = finiteSorted(added[key[1]])
+    if not len(new_values):
+        return value
+    if not count:
+        return new_values.mean(), new_values.std(), len(new_values)
+    total = count + len(new_values)
+    delta = new_values.mean() - mean
+    m2 = std**2 * count + new_values.var() * len(new_values) + delta**2 * count * len(new_values) / total
+    return mean + delta * len(new_values) / total, np.sqrt(m2 / total), total
+
+
+def histogramCounts(df: pd.DataFrame, colName: str, bins: int, value_range: tuple = None) -> tuple:
+    """
+    Bin counts and edges for the column, equal to np.histogram's. Counts come
+    from binary searches of the bin edges in the cached sorted values, so any
+    bin count or zoomed range costs O(bins log n) without rescanning the
+    column. Results are memoized per (column, bins, range).
+    """
+    def compute(frame):
+        values = sortedValues(frame, colName)
+        low, high = value_range or ((values[0], values[-1]) if len(values) else (0.0, 1.0))
+        if low == high:
+            low, high = low - 0.5, high + 0.5  # as np.histogram does
+        edges = np.linspace(low, high, bins + 1)
+        return binCounts(values, edges), edges
+
+    return derivedValue(df, ("histogram", colName, bins, value_range), compute)
+
+
 def histoToImage(
     colName: str,
     xaxis: str,
@@ -181,21 +405,39 @@ def histoToImage(
     density: bool = False,
     normal_dist: bool = False,
     histobin: int = None,
+    range_min: float = None,
+    range_max: float = None,
 ) -> str:
     """
     Generates a histogram from the specified column and emits the image via WebSocket to all clients.
     Uses Sturges' formula (k = 1 + log2(n)) to calculate optimal bin count if not specified.
+    range_min/range_max zoom into part of the value range.
     """
     try:
-        data = getColumnFromCSV(csv, colName)
-        if not all(isinstance(x, (int, float)) for x in data):
+        df = loadDataFrame(currentCsv())
+        if colName not in df.columns:
+            raise ValueError(f"Column '{colName}' not found in CSV")
+        if not pd.api.types.is_numeric_dtype(df[colName]):
             return f"Error: Column '{colName}' contains non-numeric values"
+        values = sortedValues(df, colName)
+        if len(values) == 0:
+            return f"Error: Column '{colName}' has no numeric values"
 
         # Calculate number of bins using Sturges' formula if not specified
         if histobin is None:
-            n = len(data)
+            n = len(df)
             histobin = int(1 + np.log2(n))
 
+        value_range = None
+        if range_min is not None or range_max is not None:
+            value_range = (
+                float(values[0] if range_min is None else range_min),
+                float(values[-1] if range_max is None else range_max),
+            )
+            if value_range[0] > value_range[1]:
+                return "Error: range_min must not be greater than range_max"
+        counts, edges = histogramCounts(df, colName, int(histobin), value_range)
+
         def format_yaxis(y, _):
             if density:
                 return y
@@ -204,59 +446,42 @@ def histoToImage(
                     return str(int(y))
                 return ""
 
-        plt.figure()
-        data.sort()
-        plt.hist(
-            data,
-            bins=histobin,
-            color=(33 / 255, 127 / 255, 85 / 255),
-            edgecolor="#7ed3aa",
-            density=density,
-        )
-
-        if normal_dist:
-            mean = calculateMean(colName)
-            std_dev = calculateStandardDeviation(colName)
-            xmin, xmax = plt.xlim()
-            x = np.linspace(xmin, xmax, 100)
-            p = np.exp(-0.5 * ((x - mean) / std_dev) ** 2) / (
-                std_dev * np.sqrt(2 * np.pi)
+        with chartFigure():
+            # Draw the precomputed counts: one weighted sample per bin
+            plt.hist(
+                edges[:-1],
+                bins=edges,
+                weights=counts,
+                color=(33 / 255, 127 / 255, 85 / 255),
+                edgecolor="#7ed3aa",
+                density=density,
             )
-            plt.plot(x, p, color="#d62728", linewidth=2)
-
-        plt.xlabel(xaxis)
-        plt.ylabel(yaxis)
-        plt.title(title)
-        plt.gca().yaxis.set_major_formatter(FuncFormatter(format_yaxis))
-        fig = plt.gcf()
-
-        # Save to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
 
-        # Convert to base64
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-        # Cleanup
-        plt.close("all")
-        buf.close()
-
-        # Emit the image
-        emit(
-            "image_received",
-            {"image_data": encoded_image, "format": "png"},
-            broadcast=True,
-        )
+            if normal_dist:
+                mean, std_dev, _ = derivedValue(
+                    df, ("moments", colName), lambda frame: (values.mean(), values.std(), len(values))
+                )
+                xmin, xmax = plt.xlim()
+                x = np.linspace(xmin, xmax, 100)
+                p = np.exp(-0.5 * ((x - mean) / std_dev) ** 2) / (
+                    std_dev * np.sqrt(2 * np.pi)
+                )
+                plt.plot(x, p, color="#d62728", linewidth=2)
+
+            plt.xlabel(xaxis)
+            plt.ylabel(yaxis)
+            plt.title(title)
+            plt.gca().yaxis.set_major_formatter(FuncFormatter(format_yaxis))
+
+            encoded_image = figureToBase64()
+        emitImage(encoded_image)
 
         return f"Successfully generated and emitted histogram for column '{colName}'"
     except Exception as e:
         error_msg = f"Error generating histogram: {str(e)}"
         print(error_msg)
-        emit("error", {"msg": error_msg})
+        emitEvent("error", {"msg": error_msg})
         return error_msg
-    finally:
-        plt.close("all")
 
 
 def colNameToPiechart(colName: str, title: str) -> str:
@@ -272,45 +497,27 @@ def colNameToPiechart(colName: str, title: str) -> str:
     """
     try:
         # Retrieve and organize the data based on the column name
-        data = organizeDataCount(getColumnFromCSV(csv, colName))
+        data = organizeDataCount(getColumnFromCSV(currentCsv(), colName))
 
         # Extract labels and values from the data
         labels = data.keys()
         sizes = data.values()
 
         # Create a new figure for the pie chart
-        plt.figure()
-        plt.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
-        plt.axis("equal")
-        plt.title(title)
-
-        # Save to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-
-        # Convert to base64
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-        # Cleanup
-        plt.close("all")
-        buf.close()
+        with chartFigure():
+            plt.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
+            plt.axis("equal")
+            plt.title(title)
 
-        # Emit the image
-        emit(
-            "image_received",
-            {"image_data": encoded_image, "format": "png"},
-            broadcast=True,
-        )
+            encoded_image = figureToBase64()
+        emitImage(encoded_image)
 
         return f"Successfully generated and emitted pie chart for column '{colName}'"
     except Exception as e:
         error_msg = f"Error generating pie chart: {str(e)}"
         print(error_msg)
-        emit("error", {"msg": error_msg})
+        emitEvent("error", {"msg": error_msg})
         return error_msg
-    finally:
-        plt.close("all")  # Ensure all figures are closed
 
 
 def listToPiechart(valSet: list, title: str) -> str:
@@ -333,41 +540,23 @@ def listToPiechart(valSet: list, title: str) -> str:
         sizes = data.values()
 
         # Create a new figure for the pie chart
-        plt.figure()
-        plt.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
-        plt.axis("equal")
-        plt.title(title)
+        with chartFigure():
+            plt.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
+            plt.axis("equal")
+            plt.title(title)
 
-        # Save to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-
-        # Convert to base64
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-        # Cleanup
-        plt.close("all")
-        buf.close()
-
-        # Emit the image
-        emit(
-            "image_received",
-            {"image_data": encoded_image, "format": "png"},
-            broadcast=True,
-        )
+            encoded_image = figureToBase64()
+        emitImage(encoded_image)
 
         return f"Successfully generated and emitted pie chart"
     except Exception as e:
         error_msg = f"Error generating pie chart: {str(e)}"
         print(error_msg)
-        emit("error", {"msg": error_msg})
+        emitEvent("error", {"msg": error_msg})
         return error_msg
-    finally:
-        plt.close("all")  # Ensure all figures are closed
 
 
-def get_filtered_results_from_string(query_param: str, query_value: str, target_param: str) -> list:
+def get_filtered_results_from_string(query_param: str, query_value: str, target_param: str) -> list | str:
     """
     Fetches a list of values from the target column based on a specific filter in another column.
 
@@ -377,7 +566,8 @@ def get_filtered_results_from_string(query_param: str, query_value: str, target_
         target_param: The column name to retrieve values from.
 
     Returns:
-        List of results from the target column.
+        List of results from the target column. If the list is too long for one
+        tool result, a message with the first page and a fetchMore cursor instead.
 
     Raises:
         ValueError: If columns not found or data format is invalid.
@@ -387,11 +577,11 @@ def get_filtered_results_from_string(query_param: str, query_value: str, target_
         if not all(isinstance(x, str) for x in [query_param, query_value, target_param]):
             raise ValueError("All parameters must be strings")
         
-        if not csv.strip():
+        if not currentCsv().strip():
             raise ValueError("CSV data is empty")
 
         # Parse CSV using pandas for better handling
-        df = pd.read_csv(io.StringIO(csv.strip()))
+        df = loadDataFrame(currentCsv())
 
         # Validate column names
         if query_param not in df.columns:
@@ -419,7 +609,14 @@ def get_filtered_results_from_string(query_param: str, query_value: str, target_
                 cleaned_results.append(val)
 
         print(f"Found {len(cleaned_results)} matches")
-        return cleaned_results
+        if len(str(cleaned_results)) <= TOOL_OUTPUT_CHARS:
+            return cleaned_results
+        return (
+            f"Found {len(cleaned_results)} values of '{target_param}' where {query_param} is "
+            f"'{query_value}', too many to return at once. For statistics over all of them use "
+            f"groupByAggregate or runQuery instead of the fromList tools.\n"
+            + firstPage(valueRows(cleaned_results), 500)
+        )
 
     except pd.errors.EmptyDataError:
         print("Error: CSV data is empty or malformed")
@@ -440,30 +637,19 @@ def scatterplotToImage(
     title: str,
     line_of_best_fit: bool = False,
 ) -> bytes:
-    plt.clf()  # Clear any existing plots
-    plt.scatter(xdata, ydata, color="#1f77b4")
-
-    if line_of_best_fit:
-        # Calculate line of best fit
-        m, b = np.polyfit(xdata, ydata, 1)
-        plt.plot(xdata, [m * x + b for x in xdata], color="#7ed3aa")
+    with chartFigure():
+        plt.scatter(xdata, ydata, color="#1f77b4")
 
-    plt.xlabel(xaxis)
-    plt.ylabel(yaxis)
-    plt.title(title)
-    fig = plt.gcf()
+        if line_of_best_fit:
+            # Calculate line of best fit
+            m, b = np.polyfit(xdata, ydata, 1)
+            plt.plot(xdata, [m * x + b for x in xdata], color="#7ed3aa")
 
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    buf.seek(0)
-    plt.close()  # Clean up the plot
-    return buf.getvalue()
-
-
-import base64
-import io
-import matplotlib.pyplot as plt
-from flask_socketio import emit
+        plt.xlabel(xaxis)
+        plt.ylabel(yaxis)
+        plt.title(title)
+        data = figureToPNG()
+    return data
 
 
 def bargraphToImage(colName: str, xaxis: str, yaxis: str, title: str) -> str:
@@ -480,45 +666,27 @@ def bargraphToImage(colName: str, xaxis: str, yaxis: str, title: str) -> str:
         str: A message indicating success or failure of the operation.
     """
     try:
-        data = organizeDataCount(getColumnFromCSV(csv, colName))
+        data = organizeDataCount(getColumnFromCSV(currentCsv(), colName))
 
         # Create a new figure for each plot
-        plt.figure()
+        with chartFigure():
 
-        labels = data.keys()
-        values = data.values()
-        plt.bar(labels, values, color=(33 / 255, 127 / 255, 85 / 255))
-        plt.xlabel(xaxis)
-        plt.ylabel(yaxis)
-        plt.title(title)
+            labels = data.keys()
+            values = data.values()
+            plt.bar(labels, values, color=(33 / 255, 127 / 255, 85 / 255))
+            plt.xlabel(xaxis)
+            plt.ylabel(yaxis)
+            plt.title(title)
 
-        # Save to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-
-        # Convert to base64
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-        # Cleanup
-        plt.close("all")
-        buf.close()
-
-        # Emit the image
-        emit(
-            "image_received",
-            {"image_data": encoded_image, "format": "png"},
-            broadcast=True,
-        )
+            encoded_image = figureToBase64()
+        emitImage(encoded_image)
 
         return f"Successfully generated and emitted bar graph for column '{colName}'"
     except Exception as e:
         error_msg = f"Error generating bar graph: {str(e)}"
         print(error_msg)
-        emit("error", {"msg": error_msg})
+        emitEvent("error", {"msg": error_msg})
         return error_msg
-    finally:
-        plt.close("all")  # Ensure all figures are closed
 
 def bargraphToImagefromList(data: list, xaxis: str, yaxis: str, title: str) -> str:
     """
@@ -537,42 +705,24 @@ def bargraphToImagefromList(data: list, xaxis: str, yaxis: str, title: str) -> s
         data = organizeDataCount(data)
 
         # Create a new figure for each plot
-        plt.figure()
+        with chartFigure():
 
-        labels = data.keys()
-        values = data.values()
-        plt.bar(labels, values, color=(33 / 255, 127 / 255, 85 / 255))
-        plt.xlabel(xaxis)
-        plt.ylabel(yaxis)
-        plt.title(title)
-
-        # Save to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-
-        # Convert to base64
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
+            labels = data.keys()
+            values = data.values()
+            plt.bar(labels, values, color=(33 / 255, 127 / 255, 85 / 255))
+            plt.xlabel(xaxis)
+            plt.ylabel(yaxis)
+            plt.title(title)
 
-        # Cleanup
-        plt.close("all")
-        buf.close()
-
-        # Emit the image
-        emit(
-            "image_received",
-            {"image_data": encoded_image, "format": "png"},
-            broadcast=True,
-        )
+            encoded_image = figureToBase64()
+        emitImage(encoded_image)
 
         return f"Successfully generated and emitted bar graph"
     except Exception as e:
         error_msg = f"Error generating bar graph: {str(e)}"
         print(error_msg)
-        emit("error", {"msg": error_msg})
+        emitEvent("error", {"msg": error_msg})
         return error_msg
-    finally:
-        plt.close("all")  # Ensure all figures are closed
 
 def plotgraphToImage(
     xdata: list,
@@ -581,27 +731,32 @@ def plotgraphToImage(
     yaxis: str,
     title: str,
     show_points: bool = False,
+    extra_lines: dict = None,
+    label: str = None,
 ) -> bytes:
-    try:
-        plt.figure()
-        plt.plot(xdata, ydata, color=(33 / 255, 127 / 255, 85 / 255))
+    """
+    Line chart of ydata against xdata as PNG bytes. extra_lines maps a legend
+    label to more y values drawn over the same x values.
+    """
+    with chartFigure(figsize=(10, 5) if extra_lines else None):
+        plt.plot(xdata, ydata, color=(33 / 255, 127 / 255, 85 / 255), label=label)
+        for line_label, values in (extra_lines or {}).items():
+            checkCancelled()
+            plt.plot(xdata, values, label=line_label)
 
         if show_points:
             plt.scatter(xdata, ydata, color="red")
 
+        if np.issubdtype(np.asarray(xdata).dtype, np.datetime64):
+            plt.gcf().autofmt_xdate()
+        if extra_lines:
+            plt.legend()
         plt.xlabel(xaxis)
         plt.ylabel(yaxis)
         plt.title(title)
 
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-        data = buf.getvalue()
-        buf.close()
-        plt.close("all")
-        return data
-    finally:
-        plt.close("all")
+        data = figureToPNG()
+    return data
 
 
 def modedecimalplaces(data: list) -> int:
@@ -618,8 +773,7 @@ def modedecimalplaces(data: list) -> int:
 
 
 def getFirstColumnFromCSV(csv_string: str) -> list:
-    cleaned_csv_string = csv_string.rstrip(",")  # Remove trailing comma
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")))
+    df = loadDataFrame(csv_string)
     return [
         float(x) if isinstance(x, (np.integer, np.floating)) else x
         for x in df[df.columns[0]].tolist()
@@ -628,8 +782,7 @@ def getFirstColumnFromCSV(csv_string: str) -> list:
 
 def getFirstRowFromCSV(csv_string: str) -> list:
     try:
-        rows = csv_string.strip().split("\n")
-        headers = [header.strip("\r") for header in rows[0].split(",")]
+        headers = sniff_csv(csv_string)["headers"]
         print(f"Extracted headers: {headers}")
         return headers
     except Exception as e:
@@ -639,22 +792,19 @@ def getFirstRowFromCSV(csv_string: str) -> list:
 
 def getFirstDataRowFromCSV(csv_string: str) -> list:
     try:
-        rows = csv_string.strip().split("\n")
-        if len(rows) > 1:  # Ensure there is at least one data row
-            first_data_row = [value.strip("\r") for value in rows[1].split(",")]
+        first_data_row = sniff_csv(csv_string)["data_row"]
+        if first_data_row:  # Ensure there is at least one data row
             print(f"Extracted first data row: {first_data_row}")
-            return first_data_row
         else:
             print("No data rows found in the CSV.")
-            return []
+        return first_data_row
     except Exception as e:
         print(f"Error parsing CSV data rows: {str(e)}")
         raise e
 
 
 def getColumnFromCSV(csv_string: str, col_name: str) -> list:
-    cleaned_csv_string = csv_string.rstrip(",")  # Remove trailing comma
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")))
+    df = loadDataFrame(csv_string)
     if col_name in df.columns:
         return [
             float(x) if isinstance(x, (np.integer, np.floating)) else x
@@ -665,8 +815,7 @@ def getColumnFromCSV(csv_string: str, col_name: str) -> list:
 
 
 def getRowFromCSV(csv_string: str, row_name: str) -> list:
-    cleaned_csv_string = csv_string.rstrip(",")  # Remove trailing comma
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")), index_col=0)
+    df = loadDataFrame(csv_string, index_col=0)
     if row_name in df.index:
         return [
             float(x) if isinstance(x, (np.integer, np.floating)) else x
@@ -677,8 +826,7 @@ def getRowFromCSV(csv_string: str, row_name: str) -> list:
 
 
 def countRows() -> int:
-    cleaned_csv_string = csv.rstrip(",")  # Remove trailing comma
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")))
+    df = loadDataFrame(currentCsv())
     return len(df.index)
 
 
@@ -688,8 +836,7 @@ def organizeDataCount(data: list) -> dict:
 
 def getColumnInfo(colName: str) -> str:
     """Get detailed information about a specific column in the CSV data"""
-    cleaned_csv_string = csv.rstrip(",")
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")))
+    df = loadDataFrame(currentCsv())
 
     if (colName in df.columns):
         col_data = df[colName]
@@ -713,11 +860,11 @@ def getColumnInfo(colName: str) -> str:
 
 def searchValue(query: str) -> str:
     """Search for a specific value across all columns in the CSV data"""
-    cleaned_csv_string = csv.rstrip(",")
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")))
+    df = loadDataFrame(currentCsv())
 
     results = []
     for column in df.columns:
+        checkCancelled()
         matches = df[
             df[column].astype(str).str.contains(str(query), case=False, na=False)
         ]
@@ -738,70 +885,1014 @@ def searchValue(query: str) -> str:
 
 def searchRowDetails(colName: str, query: str, limit: int = 5) -> str:
     """Search for rows where a specific column contains the query and return detailed information"""
-    cleaned_csv_string = csv.rstrip(",")
-    df = pd.read_csv(io.StringIO(cleaned_csv_string.replace("\\n", "\n")))
+    df = loadDataFrame(currentCsv())
 
     if colName not in df.columns:
         return f"Column '{colName}' not found in the data"
 
-    matches = df[df[colName].astype(str).str.contains(str(query), case=False, na=False)]
+    mask = df[colName].astype(str).str.contains(str(query), case=False, na=False)
+    positions = np.flatnonzero(mask.to_numpy())
 
-    if matches.empty:
+    if len(positions) == 0:
         return f"No matches found for '{query}' in column '{colName}'"
 
-    total_matches = len(matches)
-    matches = matches.head(limit)  # Only take the requested number of matches
+    total_matches = len(positions)
+    result = f"Found {total_matches} rows where {colName} contains '{query}':\n\n"
+    return result + firstPage(recordRows(df, positions), limit)
 
-    result = f"Found {total_matches} rows where {colName} contains '{query}':\n"
-    if total_matches > limit:
-        result += f"(Showing first {limit} matches)\n\n"
-    else:
-        result += "\n"
 
-    for idx, row in matches.iterrows():
-        result += f"Match #{idx+1}:\n"
-        for col in df.columns:
-            value = row[col]
-            if pd.isna(value):
-                value = "N/A"
-            result += f"- {col}: {value}\n"
-        result += "\n"
+# Rows per block when accumulating correlation statistics, bounding the
+# temporary float copy to CORRELATION_BLOCK_ROWS x columns
+CORRELATION_BLOCK_ROWS = 65536
 
-    return result
+
+def correlationStats(df: pd.DataFrame, columns: list) -> dict:
+    """
+    Sufficient statistics for pairwise Pearson correlation of the numeric
+    columns, accumulated in one blocked pass: per pair (i, j), over the rows
+    where both are present, the row count, sum and sum of squares of column i,
+    and the cross-product sum. Values are shifted by the column mean first to
+    keep the sums well conditioned. Cached per dataset; a cached set of columns
+    also answers any subset of it.
+    """
+    key = ("correlation_stats", tuple(columns))
+    csv_digest = currentDigest()
+    if csv_digest is not None and df is get_frame(csv_digest):
+        everything = peek_derived(csv_digest, ("correlation_stats", tuple(numericColumns(df))))
+        if everything is not None and set(columns) <= set(everything["columns"]):
+            positions = [everything["columns"].index(col) for col in columns]
+            grid = np.ix_(positions, positions)
+            return {
+                "columns": list(columns),
+                "shift": everything["shift"][positions],
+                **{name: everything[name][grid] for name in ("count", "sum", "sum_sq", "cross")},
+            }
+
+    def compute(frame):
+        k = len(columns)
+        stats = {
+            "columns": list(columns),
+            "shift": frame[columns].mean().fillna(0).to_numpy(dtype=float),
+            **{name: np.zeros((k, k)) for name in ("count", "sum", "sum_sq", "cross")},
+        }
+        return accumulateCorrelation(stats, frame)
+
+    return derivedValue(df, key, compute)
+
+
+def accumulateCorrelation(stats: dict, frame: pd.DataFrame) -> dict:
+    """Adds frame's rows to correlation statistics, in place."""
+    columns = stats["columns"]
+    for start in range(0, len(frame), CORRELATION_BLOCK_ROWS):
+        checkCancelled()
+        block = frame[columns].iloc[start : start + CORRELATION_BLOCK_ROWS]
+        values = block.to_numpy(dtype=float, na_value=np.nan) - stats["shift"]
+        present = np.isfinite(values)
+        values[~present] = 0.0
+        mask = present.astype(float)
+        stats["count"] += mask.T @ mask
+        stats["sum"] += values.T @ mask
+        stats["sum_sq"] += (values * values).T @ mask
+        stats["cross"] += values.T @ values
+    return stats
+
+
+def updateCorrelationStats(key, stats, added, offset):
+    # Same shift as the cached sums, so the new rows' sums simply add on
+    copied = {name: value.copy() if isinstance(value, np.ndarray) else value for name, value in stats.items()}
+    return accumulateCorrelation(copied, added)
+
+
+def numericColumns(df: pd.DataFrame) -> list:
+    return [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+
+
+def correlationFromStats(stats: dict) -> np.ndarray:
+    """Pairwise-complete Pearson correlation matrix, as DataFrame.corr() computes it."""
+    n, sx, sxx, sxy = stats["count"], stats["sum"], stats["sum_sq"], stats["cross"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = sxy - sx * sx.T / n
+        spread = (sxx - sx**2 / n) * (sxx.T - sx.T**2 / n)
+        matrix = covariance / np.sqrt(spread)
+    matrix[(n < 2) | ~(spread > 0)] = np.nan
+    return np.clip(matrix, -1.0, 1.0)
 
 
 def correlationAnalysis(col1: str, col2: str, title: str, show_trend: bool = True) -> str:
     try:
-        data1 = getColumnFromCSV(csv, col1)
-        data2 = getColumnFromCSV(csv, col2)
-        
-        if len(data1) != len(data2):
-            return "Error: Columns have different lengths"
-            
-        # Calculate correlation coefficient
-        correlation = np.corrcoef(data1, data2)[0,1]
-        
+        df = loadDataFrame(currentCsv())
+        for col in (col1, col2):
+            if col not in df.columns:
+                raise ValueError(f"Column '{col}' not found in CSV")
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                return f"Error: Column '{col}' contains non-numeric values"
+
+        # Correlation coefficient from the cached statistics
+        correlation = correlationFromStats(correlationStats(df, sorted({col1, col2})))
+        correlation = correlation[0, -1] if col1 != col2 else correlation[0, 0]
+
+        data1 = df[col1].to_numpy(dtype=float, na_value=np.nan)
+        data2 = df[col2].to_numpy(dtype=float, na_value=np.nan)
+        both = np.isfinite(data1) & np.isfinite(data2)
+        data1, data2 = data1[both], data2[both]
+
         # Create scatter plot
-        plt.figure(figsize=(10, 6))
-        plt.scatter(data1, data2, alpha=0.5)
+        with chartFigure(figsize=(10, 6)):
+            plt.scatter(data1, data2, alpha=0.5)
         
-        if show_trend:
-            z = np.polyfit(data1, data2, 1)
-            p = np.poly1d(z)
-            plt.plot(data1, p(data1), "r--", alpha=0.8)
+            if show_trend:
+                z = np.polyfit(data1, data2, 1)
+                p = np.poly1d(z)
+                plt.plot(data1, p(data1), "r--", alpha=0.8)
             
-        plt.xlabel(col1)
-        plt.ylabel(col2)
-        plt.title(f"{title}\nCorrelation: {correlation:.3f}")
+            plt.xlabel(col1)
+            plt.ylabel(col2)
+            plt.title(f"{title}\nCorrelation: {correlation:.3f}")
         
-        # Save and emit plot
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-        emit("image_received", {"image_data": encoded_image, "format": "png"}, broadcast=True)
+            # Save and emit plot
+            encoded_image = figureToBase64()
+        emitImage(encoded_image)
         
-        plt.close()
         return f"Correlation coefficient between {col1} and {col2}: {correlation:.3f}"
     except Exception as e:
         return f"Error performing correlation analysis: {str(e)}"
+
+
+def correlationMatrix(columns: list = None, chart: bool = True, title: str = None, limit: int = 50) -> str:
+    """
+    Pearson correlation of every pair of numeric columns (or of the given
+    columns) from one pass over the data, with the strongest pairs listed
+    first and an optional heatmap.
+    """
+    try:
+        df = loadDataFrame(currentCsv())
+        if isinstance(columns, str):
+            columns = [columns]
+        if columns:
+            missing = [col for col in columns if col not in df.columns]
+            if missing:
+                return f"Error: Column(s) not found: {', '.join(missing)}"
+            text_columns = [col for col in columns if not pd.api.types.is_numeric_dtype(df[col])]
+            if text_columns:
+                return f"Error: Column(s) contain non-numeric values: {', '.join(text_columns)}"
+            columns = list(dict.fromkeys(columns))
+        else:
+            columns = numericColumns(df)
+        if len(columns) < 2:
+            return "Error: At least two numeric columns are needed for a correlation matrix"
+
+        stats = correlationStats(df, columns)
+        matrix = correlationFromStats(stats)
+
+        upper = np.triu_indices(len(columns), k=1)
+        pairs = sorted(
+            (
+                (columns[i], columns[j], matrix[i, j], int(stats["count"][i, j]))
+                for i, j in zip(*upper)
+                if not np.isnan(matrix[i, j])
+            ),
+            key=lambda pair: -abs(pair[2]),
+        )
+        text = f"Pearson correlation of {len(columns)} numeric columns. Strongest pairs:\n"
+        text += "".join(f"- {a} / {b}: {r:.3f} (n={n})\n" for a, b, r, n in pairs[:10])
+
+        if chart:
+            size = min(4 + 0.5 * len(columns), 16)
+            with chartFigure(figsize=(size, size * 0.85)):
+                plt.imshow(matrix, cmap="RdBu_r", vmin=-1, vmax=1)
+                plt.colorbar(label="Correlation")
+                if len(columns) <= 40:
+                    plt.xticks(range(len(columns)), columns, rotation=45, ha="right")
+                    plt.yticks(range(len(columns)), columns)
+                if len(columns) <= 15:
+                    for i in range(len(columns)):
+                        for j in range(len(columns)):
+                            if not np.isnan(matrix[i, j]):
+                                plt.text(j, i, f"{matrix[i, j]:.2f}", ha="center", va="center", fontsize=8)
+                plt.title(title or "Correlation matrix")
+                plt.tight_layout()
+                encoded_image = figureToBase64()
+            emitImage(encoded_image)
+
+        table = pd.DataFrame(matrix.round(3) + 0.0, index=pd.Index(columns, name="column"), columns=columns)
+        return text + "Matrix:\n" + formatTable(table, limit)
+    except Exception as e:
+        return f"Error computing correlation matrix: {str(e)}"
+
+
+# Row-returning tools cut their output to about this many characters; the rest
+# of the result stays on the server behind a cursor read with fetchMore
+TOOL_OUTPUT_CHARS = int(os.environ.get("TOOL_OUTPUT_CHARS", 6000))
+CURSOR_LIMIT = 256
+
+# Cursors by (thread id, cursor id): a cursor is only found from its own thread
+result_cursors = OrderedDict()
+cursor_lock = threading.Lock()
+
+
+def tableRows(frame: pd.DataFrame, positions: np.ndarray = None, index: bool = True) -> dict:
+    """Pages frame (or the given row positions of it) as pipe-separated table lines."""
+    def render(start, stop):
+        rows = frame.iloc[start:stop] if positions is None else frame.iloc[positions[start:stop]]
+        # Quoted values may contain newlines, so split rows on a separator of our own
+        text = rows.to_csv(
+            sep="|", float_format="%.6g", na_rep="NaN", index=index, header=False, lineterminator="\x1e"
+        )
+        return [line + "\n" for line in text.split("\x1e")[:-1]]
+
+    header = frame.iloc[:0].to_csv(sep="|", index=index)
+    total = len(frame) if positions is None else len(positions)
+    return {"render": render, "header": header, "total": total}
+
+
+def recordRows(frame: pd.DataFrame, positions: np.ndarray) -> dict:
+    """Pages the given rows of frame as one 'column: value' block per row."""
+    columns = list(frame.columns)
+
+    def render(start, stop):
+        rows = frame.iloc[positions[start:stop]]
+        blocks = []
+        for label, values in zip(rows.index, rows.itertuples(index=False, name=None)):
+            lines = [f"Match #{label + 1}:"]
+            lines.extend(
+                f"- {col}: {'N/A' if pd.isna(value) else value}" for col, value in zip(columns, values)
+            )
+            blocks.append("\n".join(lines) + "\n\n")
+        return blocks
+
+    return {"render": render, "header": "", "total": len(positions)}
+
+
+def valueRows(values: list) -> dict:
+    """Pages a list of values, one per line."""
+    return {
+        "render": lambda start, stop: [f"{value}\n" for value in values[start:stop]],
+        "header": "",
+        "total": len(values),
+    }
+
+
+def readPage(pages: dict, cursor: str = None) -> str:
+    """
+    Renders the next page_rows rows of a paged result, stopping early at
+    TOOL_OUTPUT_CHARS. If rows remain, the result is kept under a cursor and
+    the page ends with the cursor id to pass to fetchMore.
+    """
+    # Concurrent fetchMore calls on one cursor get consecutive pages
+    with pages["lock"]:
+        start = pages["offset"]
+        budget = TOOL_OUTPUT_CHARS - len(pages["header"])
+        page, used = [], 0
+        for row in pages["render"](start, min(pages["total"], start + pages["page_rows"])):
+            checkCancelled()
+            if len(row) > budget:
+                row = row[: max(budget - used, 200)] + "...\n"  # one oversized value
+            if page and used + len(row) > budget:
+                break
+            page.append(row)
+            used += len(row)
+        end = start + len(page)
+        pages["offset"] = end
+
+    text = pages["header"] + "".join(page)
+    thread_id = currentThread()
+    with cursor_lock:
+        if end >= pages["total"]:
+            if cursor is not None:
+                result_cursors.pop((thread_id, cursor), None)
+            return text
+        if cursor is None:
+            cursor = f"c{secrets.token_hex(8)}"
+            result_cursors[(thread_id, cursor)] = pages
+            result_cacheable.set(False)
+            while len(result_cursors) > CURSOR_LIMIT:
+                result_cursors.popitem(last=False)
+        if (thread_id, cursor) in result_cursors:
+            result_cursors.move_to_end((thread_id, cursor))
+    return text + (
+        f"... showing rows {start + 1}-{end} of {pages['total']}. "
+        f"Call fetchMore with cursor '{cursor}' for the next rows\n"
+    )
+
+
+def firstPage(pages: dict, page_rows: int = 50) -> str:
+    pages.update(offset=0, page_rows=max(1, int(page_rows)), lock=threading.Lock())
+    return readPage(pages)
+
+
+def fetchMore(cursor: str) -> str:
+    """Returns the next page of a result that an earlier tool call in this thread cut short."""
+    with cursor_lock:
+        pages = result_cursors.get((currentThread(), cursor))
+    if pages is None:
+        return f"Error: Cursor '{cursor}' not found. It may be used up or expired; rerun the original tool"
+    return readPage(pages, cursor)
+
+
+def formatTable(df: pd.DataFrame, limit: int = 50, index: bool = True) -> str:
+    """Compact pipe-separated text table of at most limit rows, with a cursor for the rest."""
+    return firstPage(tableRows(df, index=index), limit)
+
+
+# Per-group reductions by name; std and var are population statistics
+# (ddof=0), like calculateStandardDeviation and calculateVariance
+GROUP_AGGREGATIONS = {
+    "mean": lambda column: column.mean(),
+    "sum": lambda column: column.sum(),
+    "count": lambda column: column.count(),
+    "min": lambda column: column.min(),
+    "max": lambda column: column.max(),
+    "median": lambda column: column.median(),
+    "std": lambda column: column.std(ddof=0),
+    "var": lambda column: column.var(ddof=0),
+}
+
+
+def groupByAggregate(
+    groupBy: list,
+    aggregations: list,
+    valueCol: str = None,
+    chart: bool = False,
+    title: str = None,
+    limit: int = 50,
+) -> str:
+    """
+    Aggregates valueCol per group of the groupBy columns in one pass over the
+    dataset, e.g. mean sales per region. Optionally emits a bar chart of the
+    first aggregation.
+    """
+    try:
+        df = loadDataFrame(currentCsv())
+        if isinstance(groupBy, str):
+            groupBy = [groupBy]
+        if isinstance(aggregations, str):
+            aggregations = [aggregations]
+
+        missing = [col for col in groupBy + ([valueCol] if valueCol else []) if col not in df.columns]
+        if missing:
+            return f"Error: Column(s) not found: {', '.join(missing)}"
+        unknown = [agg for agg in aggregations if agg not in GROUP_AGGREGATIONS]
+        if unknown or not aggregations:
+            return f"Error: Unsupported aggregation(s) {unknown}. Use: {', '.join(GROUP_AGGREGATIONS)}"
+
+        grouped = df.groupby(groupBy, sort=True, dropna=False, observed=True)
+        if valueCol is None:
+            if aggregations != ["count"]:
+                return "Error: valueCol is required for aggregations other than count"
+            result = grouped.size().to_frame("count")
+        else:
+            if aggregations != ["count"] and not pd.api.types.is_numeric_dtype(df[valueCol]):
+                return f"Error: Column '{valueCol}' contains non-numeric values"
+            column = grouped[valueCol]
+            result = pd.DataFrame({agg: GROUP_AGGREGATIONS[agg](column) for agg in aggregations})
+        checkCancelled()
+
+        if chart:
+            labels = [
+                " / ".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+                for key in result.index[:limit]
+            ]
+            with chartFigure(figsize=(max(6, len(labels) * 0.4), 5)):
+                plt.bar(labels, result.iloc[:limit, 0], color=(33 / 255, 127 / 255, 85 / 255))
+                plt.xticks(rotation=45, ha="right")
+                plt.xlabel(", ".join(groupBy))
+                plt.ylabel(f"{result.columns[0]} of {valueCol}" if valueCol else "count")
+                plt.title(title or f"{result.columns[0]} by {', '.join(groupBy)}")
+                plt.tight_layout()
+                encoded_image = figureToBase64()
+            emitImage(encoded_image)
+
+        target = f" of '{valueCol}'" if valueCol else ""
+        return (
+            f"{', '.join(aggregations)}{target} by {', '.join(groupBy)} "
+            f"({len(result)} groups):\n" + formatTable(result, limit)
+        )
+    except Exception as e:
+        return f"Error performing group-by aggregation: {str(e)}"
+
+
+DESCRIBE_STATS = [
+    "dtype", "count", "missing", "unique", "mean", "std", "variance",
+    "min", "max", "median", "top",
+]
+DEFAULT_DESCRIBE_STATS = [
+    "dtype", "count", "missing", "unique", "mean", "std", "min", "p25", "median", "p75", "max",
+]
+
+
+def describeColumns(columns: list = None, stats: list = None, limit: int = 100) -> str:
+    """
+    Computes the requested statistics for many columns at once, vectorized
+    over the cached dataset. stats may include percentiles written as 'p95'
+    or 'p99.9'. Variance and std are population values, like calculateVariance.
+    """
+    try:
+        df = loadDataFrame(currentCsv())
+        if isinstance(columns, str):
+            columns = [columns]
+        columns = columns or list(df.columns)
+        if isinstance(stats, str):
+            stats = [stats]
+        stats = stats or DEFAULT_DESCRIBE_STATS
+
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            return f"Error: Column(s) not found: {', '.join(missing)}"
+
+        percentiles = {}
+        for stat in stats:
+            match = re.fullmatch(r"p(\d+(?:\.\d+)?)", stat)
+            if match and float(match.group(1)) <= 100:
+                percentiles[stat] = float(match.group(1)) / 100
+            elif stat not in DESCRIBE_STATS:
+                return f"Error: Unsupported statistic '{stat}'. Use: {', '.join(DESCRIBE_STATS)} or percentiles like 'p95'"
+        if "median" in stats:
+            percentiles["median"] = 0.5
+
+        frame = df[columns]
+        numeric = frame.select_dtypes(include="number")
+        computed = {
+            "dtype": lambda: frame.dtypes.astype(str),
+            "count": frame.count,
+            "missing": lambda: frame.isna().sum(),
+            "unique": frame.nunique,
+            "mean": numeric.mean,
+            "std": lambda: numeric.std(ddof=0),
+            "variance": lambda: numeric.var(ddof=0),
+            "min": numeric.min,
+            "max": numeric.max,
+            "top": lambda: frame.apply(
+                lambda col: col.value_counts().index[0] if col.notna().any() else None
+            ),
+        }
+
+        table = pd.DataFrame(index=pd.Index(columns, name="column"))
+        for stat in stats:
+            checkCancelled()
+            if stat in computed and stat != "median":
+                table[stat] = computed[stat]()
+
+        # All percentiles (and the median) in one quantile pass
+        if percentiles and not numeric.empty:
+            quantiles = numeric.quantile(sorted(set(percentiles.values())))
+            for stat, q in percentiles.items():
+                table[stat] = quantiles.loc[q]
+        for stat in stats:
+            if stat not in table.columns:
+                table[stat] = None
+
+        return (
+            f"Statistics for {len(columns)} column(s):\n"
+            + formatTable(table[list(dict.fromkeys(stats))], limit)
+        )
+    except Exception as e:
+        return f"Error describing columns: {str(e)}"
+
+
+TIME_FREQUENCIES = {
+    "hour": "h",
+    "day": "D",
+    "week": "W",
+    "month": "MS",
+    "quarter": "QS",
+    "year": "YS",
+}
+TIME_AGGREGATIONS = ["mean", "sum", "count", "min", "max", "median"]
+
+
+def timeIndex(df: pd.DataFrame, dateCol: str) -> tuple:
+    """
+    The date column's non-missing timestamps in ascending order, with the row
+    positions they came from. Text dates (ingest keeps them as uploaded) are
+    parsed here. Cached per dataset, so each column is parsed and sorted only once.
+    """
+    def compute(frame):
+        dates = frame[dateCol]
+        if pd.api.types.is_numeric_dtype(dates) or pd.api.types.is_bool_dtype(dates):
+            # to_datetime would read numbers as offsets from 1970
+            raise ValueError(f"Column '{dateCol}' does not contain dates")
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            head = dates.dropna().head(100)
+            if parseDates(head).notna().sum() < len(head) / 2:
+                raise ValueError(f"Column '{dateCol}' does not contain dates")
+        return sortDates(parseDates(dates), dateCol)
+
+    return derivedValue(df, ("time_index", dateCol), compute)
+
+
+def parseDates(dates: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # per-element parsing fallback
+        return pd.to_datetime(dates, errors="coerce")
+
+
+def sortDates(dates: pd.Series, name: str, offset: int = 0) -> tuple:
+    values = dates.to_numpy()
+    positions = np.flatnonzero(~np.isnat(values))
+    order = positions[np.argsort(values[positions], kind="stable")]
+    return pd.DatetimeIndex(values[order], name=name), order + offset
+
+
+def updateTimeIndex(key, value, added, offset):
+    index, order = value
+    new_index, new_order = sortDates(parseDates(added[key[1]]), key[1], offset)
+    # Merge the two sorted runs; stable, so earlier rows stay first on ties
+    merge = np.argsort(np.concatenate([index.to_numpy(), new_index.to_numpy()]), kind="stable")
+    return (
+        pd.DatetimeIndex(np.concatenate([index.to_numpy(), new_index.to_numpy()])[merge], name=key[1]),
+        np.concatenate([order, new_order])[merge],
+    )
+
+
+def timeSeries(
+    dateCol: str,
+    valueCol: str = None,
+    freq: str = "month",
+    aggregation: str = "mean",
+    rolling: int = None,
+    cumulative: bool = False,
+    chart: bool = True,
+    title: str = None,
+    limit: int = 50,
+) -> str:
+    """
+    Resamples valueCol over dateCol into fixed periods (e.g. monthly mean
+    sales), optionally adding a rolling mean over the periods and a running
+    total. Without valueCol it counts rows per period. Emits a line chart.
+    """
+    try:
+        df = loadDataFrame(currentCsv())
+        missing = [col for col in [dateCol, valueCol] if col and col not in df.columns]
+        if missing:
+            return f"Error: Column(s) not found: {', '.join(missing)}"
+        if freq not in TIME_FREQUENCIES:
+            return f"Error: Unsupported frequency '{freq}'. Use: {', '.join(TIME_FREQUENCIES)}"
+        if valueCol is None:
+            aggregation = "count"
+        elif aggregation not in TIME_AGGREGATIONS:
+            return f"Error: Unsupported aggregation '{aggregation}'. Use: {', '.join(TIME_AGGREGATIONS)}"
+        elif aggregation != "count" and not pd.api.types.is_numeric_dtype(df[valueCol]):
+            return f"Error: Column '{valueCol}' contains non-numeric values"
+
+        index, order = timeIndex(df, dateCol)
+        if len(index) == 0:
+            return f"Error: Column '{dateCol}' has no dates"
+        values = df[valueCol].to_numpy()[order] if valueCol else np.ones(len(order))
+        series = pd.Series(values, index=index)
+
+        name = f"{aggregation}_{valueCol}" if valueCol else "count"
+        resampled = series.resample(TIME_FREQUENCIES[freq]).agg(aggregation)
+        result = resampled.to_frame(name)
+        if rolling:
+            result[f"rolling_mean_{int(rolling)}"] = resampled.rolling(int(rolling), min_periods=1).mean()
+        if cumulative:
+            result[f"cumulative_{name}"] = resampled.cumsum()
+
+        if chart:
+            periods = result.index.to_numpy()
+            extra = {col: result[col].to_numpy() for col in result.columns[1:]}
+            encoded_image = base64.b64encode(
+                plotgraphToImage(
+                    periods,
+                    result[name].to_numpy(),
+                    dateCol,
+                    name,
+                    title or f"{name} per {freq}",
+                    extra_lines=extra or None,
+                    label=name,
+                )
+            ).decode("utf-8")
+            emitImage(encoded_image)
+
+        return (
+            f"{name} per {freq} from {index[0]} to {index[-1]} ({len(result)} periods):\n"
+            + formatTable(result, limit)
+        )
+    except Exception as e:
+        return f"Error computing time series: {str(e)}"
+
+
+# The column list given to the assistant each turn is cut off at this many
+# characters; findColumns looks up the rest on demand
+SCHEMA_CONTEXT_CHARS = int(os.environ.get("SCHEMA_CONTEXT_CHARS", 2000))
+
+# The example row shows at most this many columns, each value cut to SCHEMA_EXAMPLE_CHARS
+SCHEMA_EXAMPLE_COLUMNS = 20
+SCHEMA_EXAMPLE_CHARS = 40
+
+
+def typeLabel(dtype) -> str:
+    """Short name of a column's type for the assistant."""
+    dtype = str(dtype)
+    if dtype.startswith(("int", "uint", "Int")):
+        return "int"
+    if dtype.startswith(("float", "Float")):
+        return "float"
+    if dtype.startswith("datetime"):
+        return "datetime"
+    if dtype in ("bool", "boolean", "category"):
+        return dtype.replace("boolean", "bool")
+    return "text"
+
+
+def columnTypes(digest: str) -> dict:
+    """
+    {column: type label} of a stored dataset. Taken from the parsed frame when
+    there is one; otherwise inferred from a leading sample (as the parser
+    does), so building the run instructions never waits for a full parse.
+    Text columns of ISO dates are labelled as datetimes.
+    """
+    types = peek_derived(digest, ("column_types",))
+    if types is None:
+        entry = get_dataset(digest)
+        frame = entry["frame"]
+        if frame is not None:
+            dtypes = [
+                (
+                    column,
+                    "datetime64[ns]"
+                    if dtype == object and looks_like_dates(frame[column].head(100))
+                    else dtype,
+                )
+                for column, dtype in frame.dtypes.items()
+            ]
+        else:
+            try:
+                sampled = sample_dtypes(
+                    entry["csv_data"], delimiter=entry["delimiter"], detect_dates=True
+                )
+            except Exception:
+                sampled = {}
+            dtypes = [
+                (column, {**sampled, **entry["dtypes"]}.get(column, "object"))
+                for column in entry["headers"]
+            ]
+        types = {str(column): typeLabel(dtype) for column, dtype in dtypes}
+        set_derived(digest, ("column_types",), types)
+    return types
+
+
+def columnGroups(types: dict) -> list:
+    """
+    Collapses runs of numbered columns with the same type (sensor_1,
+    sensor_2, ...) into one entry. Returns [(label, type, column count)].
+    """
+    groups = []
+    run = None  # [prefix, first number, last number, type, first name, last name]
+    for column, label in types.items():
+        match = re.fullmatch(r"(.*?)(\d+)", column)
+        if (
+            run is not None
+            and match is not None
+            and match.group(1) == run[0]
+            and int(match.group(2)) == run[2] + 1
+            and label == run[3]
+        ):
+            run[2] += 1
+            run[5] = column
+            continue
+        if run is not None:
+            groups.append(run)
+        if match is not None:
+            number = int(match.group(2))
+            run = [match.group(1), number, number, label, column, column]
+        else:
+            groups.append([None, 0, 0, label, column, column])
+            run = None
+    if run is not None:
+        groups.append(run)
+    return [
+        (first if first == last else f"{first}..{last}", label, high - low + 1)
+        for _, low, high, label, first, last in groups
+    ]
+
+
+def schemaSummary(digest: str, max_chars: int = SCHEMA_CONTEXT_CHARS) -> str:
+    """
+    Compact, type-annotated column list of a stored dataset, e.g.
+    '503 columns: id (int), sensor_1..sensor_500 (float, 500 columns), ...',
+    cut off at max_chars with a pointer to findColumns. Computed once per dataset.
+    """
+    key = ("schema_summary", max_chars)
+    summary = peek_derived(digest, key)
+    if summary is not None:
+        return summary
+
+    types = columnTypes(digest)
+    parts, used, shown = [], 0, 0
+    for label, kind, count in columnGroups(types):
+        part = f"{label} ({kind})" if count == 1 else f"{label} ({kind}, {count} columns)"
+        if parts and used + len(part) > max_chars:
+            break
+        parts.append(part)
+        used += len(part) + 2
+        shown += count
+    summary = f"{len(types)} columns: {', '.join(parts)}"
+    if shown < len(types):
+        summary += f", ... and {len(types) - shown} more (call findColumns to look them up)"
+    set_derived(digest, key, summary)
+    return summary
+
+
+def schemaExample(digest: str) -> dict:
+    """The dataset's first data row for the leading columns, long values shortened."""
+    entry = get_dataset(digest)
+    example = {}
+    for column, value in list(zip(entry["headers"], entry["data_row"]))[:SCHEMA_EXAMPLE_COLUMNS]:
+        if len(value) > SCHEMA_EXAMPLE_CHARS:
+            value = value[: SCHEMA_EXAMPLE_CHARS - 3] + "..."
+        example[column] = value
+    return example
+
+
+def schemaContext(digest: str) -> str:
+    """The dataset description put in the run instructions: column summary and example row."""
+    context = peek_derived(digest, ("schema_context",))
+    if context is None:
+        headers = get_dataset(digest)["headers"]
+        example = schemaExample(digest)
+        scope = "" if len(example) == len(headers) else f" (first {len(example)} columns)"
+        context = (
+            f"The CSV file has {schemaSummary(digest)}.\n"
+            f"An example row contains{scope}: {example}"
+        )
+        set_derived(digest, ("schema_context",), context)
+    return context
+
+
+def findColumns(pattern: str, limit: int = 50) -> str:
+    """
+    Looks up the current dataset's columns by name. pattern is a
+    case-insensitive substring, a wildcard pattern (* and ?) or a regular
+    expression. Returns the matches with their types and example values.
+    """
+    csv_digest = currentDigest()
+    if csv_digest is None:
+        return "Error: No dataset is loaded"
+    types = columnTypes(csv_digest)
+    example = dict(zip(get_dataset(csv_digest)["headers"], get_dataset(csv_digest)["data_row"]))
+    needle = pattern.lower()
+    # Wildcards unless the pattern uses regular expression syntax ("sensor_*" vs "^sensor_.*")
+    if any(char in pattern for char in "*?") and not any(char in pattern for char in "^$.()+|\\{"):
+        matches = [col for col in types if fnmatch.fnmatchcase(col.lower(), needle)]
+    else:
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+            matches = [col for col in types if regex.search(col)]
+        except re.error:
+            matches = [col for col in types if needle in col.lower()]
+    if not matches:
+        return f"No columns match '{pattern}' (the dataset has {len(types)} columns)"
+
+    limit = max(1, int(limit))
+    lines = []
+    for col in matches[:limit]:
+        value = example.get(col, "")
+        if len(value) > SCHEMA_EXAMPLE_CHARS:
+            value = value[: SCHEMA_EXAMPLE_CHARS - 3] + "..."
+        lines.append(f"- {col} ({types[col]}), e.g. {value!r}")
+    result = f"{len(matches)} of {len(types)} columns match '{pattern}':\n" + "\n".join(lines)
+    if len(matches) > limit:
+        result += f"\n... and {len(matches) - limit} more; use a narrower pattern or a higher limit"
+    return result
+
+
+JOIN_TYPES = ["inner", "left", "anti"]
+
+# Joins whose estimated result is larger than this are refused
+JOIN_MAX_ROWS = int(os.environ.get("JOIN_MAX_ROWS", 5_000_000))
+
+
+def listDatasets() -> str:
+    """Lists the datasets loaded in this chat thread with their sizes and columns."""
+    csv_thread = currentThread()
+    if csv_thread is None:
+        return "Error: Datasets are only available within a chat thread"
+    active_name, _ = active_dataset(csv_thread)
+    lines = []
+    for name, digest in thread_datasets(csv_thread).items():
+        frame = get_frame(digest)
+        marker = " (active)" if name == active_name else ""
+        lines.append(f"- {name}{marker}: {len(frame)} rows; {schemaSummary(digest, 500)}")
+    if not lines:
+        return "No datasets are loaded in this thread"
+    return "Datasets in this thread:\n" + "\n".join(lines)
+
+
+def useDataset(name: str) -> str:
+    """
+    Makes another of the thread's datasets the active one. The thread's later
+    tool calls work on it; calls already queued keep the dataset they were
+    submitted with.
+    """
+    csv_thread = currentThread()
+    if csv_thread is None:
+        return "Error: Datasets are only available within a chat thread"
+    try:
+        dataset = activate_dataset(csv_thread, name)
+    except KeyError:
+        return f"Error: Dataset '{name}' not found. Loaded datasets: {', '.join(thread_datasets(csv_thread))}"
+    frame = get_frame(dataset["digest"])
+    return f"Now using dataset '{name}' ({len(frame)} rows). {schemaContext(dataset['digest'])}"
+
+
+def joinDatasets(
+    left: str,
+    right: str,
+    on: list = None,
+    leftOn: list = None,
+    rightOn: list = None,
+    how: str = "inner",
+    name: str = None,
+) -> str:
+    """
+    Hash-joins two of the thread's datasets on key columns and stores the
+    result as a new named dataset, which becomes the active one. how is
+    inner, left (keep every left row) or anti (left rows with no match).
+    Right-side columns whose names clash get the right dataset's name as a suffix.
+    """
+    csv_thread = currentThread()
+    if csv_thread is None:
+        return "Error: Datasets are only available within a chat thread"
+    names = thread_datasets(csv_thread)
+    missing = [dataset for dataset in (left, right) if dataset not in names]
+    if missing:
+        return f"Error: Dataset(s) not found: {', '.join(missing)}. Loaded datasets: {', '.join(names)}"
+    if how not in JOIN_TYPES:
+        return f"Error: Unsupported join type '{how}'. Use: {', '.join(JOIN_TYPES)}"
+
+    as_list = lambda cols: [cols] if isinstance(cols, str) else list(cols or [])
+    left_keys = as_list(leftOn or on)
+    right_keys = as_list(rightOn or on)
+    if not left_keys or len(left_keys) != len(right_keys):
+        return "Error: Give the key columns as 'on', or as 'leftOn' and 'rightOn' of equal length"
+
+    try:
+        left_frame = get_frame(names[left])
+        right_frame = get_frame(names[right])
+        for dataset, frame, keys in ((left, left_frame, left_keys), (right, right_frame, right_keys)):
+            absent = [col for col in keys if col not in frame.columns]
+            if absent:
+                return f"Error: Column(s) not found in '{dataset}': {', '.join(absent)}"
+
+        if how == "anti":
+            # Key tuples of both sides, hashed once; isin probes the right side's table
+            left_index = pd.MultiIndex.from_frame(left_frame[left_keys])
+            right_index = pd.MultiIndex.from_frame(right_frame[right_keys])
+            result = left_frame[~left_index.isin(right_index)].reset_index(drop=True)
+        else:
+            # Estimate the output size before building it (many-to-many keys multiply).
+            # Key tuples get one id across both sides; like merge, NaN keys match NaN
+            keys = pd.concat(
+                [left_frame[left_keys], right_frame[right_keys].set_axis(left_keys, axis=1)],
+                ignore_index=True,
+            )
+            ids = keys.groupby(left_keys, sort=False, dropna=False).ngroup().to_numpy()
+            left_ids, right_ids = ids[: len(left_frame)], ids[len(left_frame):]
+            matches = np.bincount(right_ids, minlength=ids.max() + 1 if len(ids) else 0)[left_ids]
+            estimated = int(matches.sum() + (matches == 0).sum() if how == "left" else matches.sum())
+            if estimated > JOIN_MAX_ROWS:
+                return (
+                    f"Error: The join would produce about {estimated} rows (limit {JOIN_MAX_ROWS}); "
+                    "the keys likely repeat on both sides. Join on more specific columns or aggregate first"
+                )
+            result = left_frame.merge(
+                right_frame,
+                how=how,
+                left_on=left_keys,
+                right_on=right_keys,
+                suffixes=("", f"_{right}"),
+                sort=False,
+            )
+
+        name = name or f"{left}_{how}_{right}"
+        digest = store_frame(result)
+        attach_dataset(csv_thread, digest, name)
+        snapshots.save_thread_soon(csv_thread)
+        return (
+            f"Created dataset '{name}' with {len(result)} rows ({how} join of '{left}' and "
+            f"'{right}' on {', '.join(left_keys)}"
+            + (f" = {', '.join(right_keys)}" if right_keys != left_keys else "")
+            + f"). It is now the active dataset; the tools work on it until useDataset switches back.\n"
+            f"Columns: {', '.join(str(col) for col in result.columns)}"
+        )
+    except Exception as e:
+        return f"Error joining datasets: {str(e)}"
+
+
+# Limits for runQuery; the SQL runs inside the server process
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("QUERY_TIMEOUT_SECONDS", 10))
+QUERY_MEMORY_LIMIT = os.environ.get("QUERY_MEMORY_LIMIT", "512MB")
+QUERY_MAX_ROWS = int(os.environ.get("QUERY_MAX_ROWS", 10000))
+
+
+def runQuery(sql: str, limit: int = 50) -> str:
+    """
+    Runs a read-only SQL query (DuckDB dialect) against the dataset, exposed as
+    the table 'data'. Only a single SELECT/WITH statement is accepted; file and
+    network access are disabled, and the query is interrupted after
+    QUERY_TIMEOUT_SECONDS and limited to QUERY_MEMORY_LIMIT.
+    """
+    import duckdb
+
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as e:
+        return f"Error running query: {str(e)}"
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        return "Error: Only a single SELECT (or WITH ... SELECT) statement is allowed"
+    statement = statements[0].query
+
+    con = duckdb.connect(":memory:")
+    # Interrupt the query when it runs out of time or the tool call is cancelled
+    stop = tool_cancel.get() or threading.Event()
+    finished = threading.Event()
+
+    def watch():
+        deadline = time.monotonic() + QUERY_TIMEOUT_SECONDS
+        while not finished.wait(0.05):
+            if stop.is_set() or time.monotonic() >= deadline:
+                try:
+                    con.interrupt()
+                except duckdb.Error:
+                    pass  # the query finished and the connection closed meanwhile
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    try:
+        con.execute(f"SET memory_limit='{QUERY_MEMORY_LIMIT}'")
+        con.execute("SET enable_external_access=false")
+        con.execute("SET lock_configuration=true")
+        con.register("data", loadDataFrame(currentCsv()))
+
+        watcher.start()
+        result = con.sql(statement).limit(QUERY_MAX_ROWS + 1).df()
+        finished.set()
+
+        if len(result) > QUERY_MAX_ROWS:
+            text = (
+                f"Query returned more than {QUERY_MAX_ROWS} rows; only the first {QUERY_MAX_ROWS} "
+                f"are kept. Aggregate or add a LIMIT to narrow the result.\n"
+            )
+            result = result.head(QUERY_MAX_ROWS)
+        else:
+            text = f"Query returned {len(result)} row(s):\n"
+        return text + formatTable(result, limit, index=False)
+    except duckdb.InterruptException:
+        if stop.is_set():
+            raise ToolCancelled("Query was cancelled")
+        return f"Error: Query exceeded the {QUERY_TIMEOUT_SECONDS:g}s time limit"
+    except duckdb.Error as e:
+        return f"Error running query: {str(e)}"
+    finally:
+        finished.set()
+        con.close()
+
+
+# Tools the assistant can call, by the names declared in functions.AItools
+function_map = {
+    "calculateMean": calculateMean,
+    "calculateMedian": calculateMedian,
+    "calculateMode": calculateMode,
+    "calculateVariance": calculateVariance,
+    "calculateStandardDeviation": calculateStandardDeviation,
+    "countRows": countRows,
+    "getColumnInfo": getColumnInfo,
+    "searchValue": searchValue,
+    "searchRowDetails": searchRowDetails,
+    "bargraphToImage": bargraphToImage,
+    "histoToImage": histoToImage,
+    "colNameToPiechart": colNameToPiechart,
+    "get_filtered_results_from_string": get_filtered_results_from_string,
+    "listToPiechart": listToPiechart,
+    "correlationAnalysis": correlationAnalysis,
+    "calculateMeanfromList": calculateMeanfromList,
+    "calculateMedianfromList": calculateMedianfromList,
+    "calculateModefromList": calculateModefromList,
+    "calculateVariancefromList": calculateVariancefromList,
+    "calculateStandardDeviationfromList": calculateStandardDeviationfromList,
+    "bargraphToImagefromList": bargraphToImagefromList,
+    "groupByAggregate": groupByAggregate,
+    "describeColumns": describeColumns,
+    "runQuery": runQuery,
+    "fetchMore": fetchMore,
+    "timeSeries": timeSeries,
+    "correlationMatrix": correlationMatrix,
+    "findColumns": findColumns,
+    "listDatasets": listDatasets,
+    "useDataset": useDataset,
+    "joinDatasets": joinDatasets,
+}
+
+# Keep cached statistics current when rows are appended (see datastore.append_dataset)
+derived_updaters.update(
+    {
+        "sorted_values": updateSortedValues,
+        "histogram": updateHistogram,
+        "moments": updateMoments,
+        "correlation_stats": updateCorrelationStats,
+        "time_index": updateTimeIndex,
+    }
+)
@@ -167,7 +167,7 @@ AItools = [
                     },
                     "limit": {
                         "type": "integer",
-                        "description": "Maximum number of matching rows to show in detail (optional, defaults to 5)",
+                        "description": "Number of matching rows to show per page (optional, defaults to 5). Further rows can be read with fetchMore",
                     },
                 },
                 "required": ["colName", "query"],
@@ -205,7 +205,7 @@ AItools = [
         "type": "function",
         "function": {
             "name": "histoToImage",
-            "description": "Generates and emits a histogram visualization from numeric data. Returns a success/error message string. The histogram image is automatically sent to connected clients via WebSocket. Supports density normalization and normal distribution overlay. Example return: 'Successfully generated and emitted histogram for column 'Age'' or 'Error: Column contains non-numeric values'",
+            "description": "Generates and emits a histogram visualization from numeric data. Returns a success/error message string. The histogram image is automatically sent to connected clients via WebSocket. Supports density normalization, normal distribution overlay and zooming into a value range. Re-binning or zooming the same column is cheap, so it is fine to call again with different bins or ranges. Example return: 'Successfully generated and emitted histogram for column 'Age'' or 'Error: Column contains non-numeric values'",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -237,6 +237,14 @@ AItools = [
                         "type": "integer",
                         "description": "Number of bins for the histogram. If omitted, uses Sturges' formula: k = 1 + log2(n)",
                     },
+                    "range_min": {
+                        "type": "number",
+                        "description": "Lower end of the value range to show, to zoom into part of the distribution (optional, defaults to the column minimum)",
+                    },
+                    "range_max": {
+                        "type": "number",
+                        "description": "Upper end of the value range to show (optional, defaults to the column maximum)",
+                    },
                 },
                 "required": ["colName", "xaxis", "yaxis", "title"],
                 "additionalProperties": False,
@@ -271,7 +279,7 @@ AItools = [
         "type": "function",
         "function": {
             "name": "get_filtered_results_from_string",
-            "description": "Fetches a list of values from a target column in a CSV string based on a specific filter applied to another column.",
+            "description": "Fetches a list of values from a target column in a CSV string based on a specific filter applied to another column. Very long lists are returned one page at a time with a cursor for fetchMore; for statistics over many matches prefer groupByAggregate or runQuery.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -485,4 +493,299 @@ AItools = [
             "strict": True,
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "groupByAggregate",
+            "description": "Aggregate a numeric column per group in a single call, e.g. average sales per region or total revenue per region and year. Use this instead of calling get_filtered_results_from_string once per group. Returns a compact table with one row per group (pipe-separated, at most 'limit' rows) and can also emit a bar chart of the first aggregation. Example return: 'mean of 'Sales' by Region (3 groups):\nRegion|mean\nEast|120.5\nNorth|98.2\nWest|143'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "groupBy": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "One or more column names to group by, exactly as they appear in the CSV header. Example: ['Region'] or ['Region', 'Year']",
+                    },
+                    "aggregations": {
+                        "type": "array",
+                        "items": {
+                            "type": "string",
+                            "enum": ["mean", "sum", "count", "min", "max", "median", "std", "var"],
+                        },
+                        "description": "Aggregations to compute per group. Example: ['mean', 'count']",
+                    },
+                    "valueCol": {
+                        "type": "string",
+                        "description": "The numeric column to aggregate. May be omitted only when aggregations is ['count'].",
+                    },
+                    "chart": {
+                        "type": "boolean",
+                        "description": "When true, also emits a bar chart of the first aggregation per group",
+                    },
+                    "title": {
+                        "type": "string",
+                        "description": "Title for the chart (optional)",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of groups to return (optional, defaults to 50)",
+                    },
+                },
+                "required": ["groupBy", "aggregations"],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "describeColumns",
+            "description": "Compute several statistics for several columns in one call. Use this for dataset overviews or multi-column comparisons instead of calling calculateMean, calculateMedian, calculateStandardDeviation or getColumnInfo separately per column. Returns a compact pipe-separated table with one row per column. Numeric statistics are NaN for non-numeric columns. Example return: 'Statistics for 2 column(s):\ncolumn|mean|p95\nAge|42.5|71\nIncome|51000|120000'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "columns": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Column names exactly as they appear in the CSV header. Omit to describe every column.",
+                    },
+                    "stats": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Statistics to compute: dtype, count, missing, unique, mean, std, variance, min, max, median, top (most common value), or any percentile written as 'p' plus a number, e.g. 'p5', 'p95', 'p99.9'. Omit for dtype, count, missing, unique, mean, std, min, p25, median, p75, max.",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of columns to return (optional, defaults to 100)",
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "runQuery",
+            "description": "Run a read-only SQL query (DuckDB dialect) against the uploaded dataset, available as the table 'data'. Use it for questions the other tools can't express in one call: combined filters, ranges, computed columns, ORDER BY/LIMIT, top-N, or aggregates over filtered rows. Quote column names containing spaces or capitals with double quotes, e.g. \"Sales Rep\". Only a single SELECT or WITH statement is allowed. Returns a compact pipe-separated table; long results come back one page at a time with a cursor for fetchMore, so prefer aggregating or LIMIT in SQL. Example return: 'Query returned 2 row(s):\nRegion|total\nEast|4200\nWest|3100'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "sql": {
+                        "type": "string",
+                        "description": "The SELECT statement. Example: SELECT \"Region\", SUM(\"Sales\") AS total FROM data WHERE \"Year\" = 2023 GROUP BY 1 ORDER BY total DESC LIMIT 5",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Rows per page of the result (optional, defaults to 50). Further rows can be read with fetchMore",
+                    },
+                },
+                "required": ["sql"],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "fetchMore",
+            "description": "Returns the next page of a result that an earlier tool call cut short. Use the cursor id from the end of that result, e.g. \"... showing rows 1-50 of 320. Call fetchMore with cursor 'c1a2b3c4d' for the next rows\". Each call returns the following page and a new position until the result is exhausted.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "cursor": {
+                        "type": "string",
+                        "description": "The cursor id, e.g. c1a2b3c4d",
+                    },
+                },
+                "required": ["cursor"],
+                "additionalProperties": False,
+            },
+            "strict": True,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "timeSeries",
+            "description": "Analyzes a value over time in one call: groups rows into periods of a date column (hour, day, week, month, quarter, year), aggregates the value per period, and can add a rolling mean over the periods and a running total. Without valueCol it counts rows per period (e.g. events per week). Emits a line chart to all connected clients. Use for trend, seasonality and growth questions. Example return: 'sum_Sales per month from 2023-01-02 to 2023-03-30 (3 periods):\nDate|sum_Sales|rolling_mean_3\n2023-01-01|1200|1200\n2023-02-01|1500|1350\n2023-03-01|900|1200'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "dateCol": {
+                        "type": "string",
+                        "description": "The column holding the dates or timestamps",
+                    },
+                    "valueCol": {
+                        "type": "string",
+                        "description": "The numeric column to aggregate per period (optional; omit to count rows)",
+                    },
+                    "freq": {
+                        "type": "string",
+                        "enum": ["hour", "day", "week", "month", "quarter", "year"],
+                        "description": "Period length (optional, defaults to month)",
+                    },
+                    "aggregation": {
+                        "type": "string",
+                        "enum": ["mean", "sum", "count", "min", "max", "median"],
+                        "description": "How to combine the values in each period (optional, defaults to mean)",
+                    },
+                    "rolling": {
+                        "type": "integer",
+                        "description": "Add a rolling mean over this many periods (optional)",
+                    },
+                    "cumulative": {
+                        "type": "boolean",
+                        "description": "Add a running total of the aggregated values (optional, defaults to false)",
+                    },
+                    "chart": {
+                        "type": "boolean",
+                        "description": "Whether to emit a line chart (optional, defaults to true)",
+                    },
+                    "title": {
+                        "type": "string",
+                        "description": "Chart title (optional)",
+                    },
+                },
+                "required": ["dateCol"],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "correlationMatrix",
+            "description": "Computes the Pearson correlation between every pair of numeric columns in one call (or between the listed columns) and emits a heatmap to all connected clients. Use this for 'which columns are related?' questions instead of calling correlationAnalysis pair by pair. Missing values are skipped pairwise. Returns the strongest pairs followed by the full matrix. Example return: 'Pearson correlation of 3 numeric columns. Strongest pairs:\n- Price / Sales: -0.812 (n=1200)\n...\nMatrix:\ncolumn|Price|Sales|Units\n...'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "columns": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Numeric columns to include (optional, defaults to all numeric columns)",
+                    },
+                    "chart": {
+                        "type": "boolean",
+                        "description": "Whether to emit a heatmap (optional, defaults to true)",
+                    },
+                    "title": {
+                        "type": "string",
+                        "description": "Heatmap title (optional)",
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "listDatasets",
+            "description": "Lists the datasets loaded in this chat thread (uploaded files and join results) with their row counts and columns, marking the one the other tools currently work on. Example return: 'Datasets in this thread:\n- orders (active): 1200 rows; columns: order_id, customer_id, amount\n- customers: 300 rows; columns: customer_id, region'",
+            "parameters": {
+                "type": "object",
+                "properties": {},
+                "required": [],
+                "additionalProperties": False,
+            },
+            "strict": True,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "useDataset",
+            "description": "Switches every other tool to another dataset loaded in this thread. Example return: 'Now using dataset 'customers' (300 rows). Columns: customer_id, region'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "The dataset name, as shown by listDatasets",
+                    },
+                },
+                "required": ["name"],
+                "additionalProperties": False,
+            },
+            "strict": True,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "joinDatasets",
+            "description": "Joins two datasets of this thread on key columns, on the server, and stores the result as a new named dataset that becomes the active one, so every other tool can analyze it. Use this instead of copying values between datasets. 'inner' keeps rows with a match on both sides, 'left' keeps every left row (right columns empty when unmatched), 'anti' keeps the left rows with no match (e.g. orders without a known customer). Example return: 'Created dataset 'orders_inner_customers' with 1180 rows (inner join of 'orders' and 'customers' on customer_id). It is now the active dataset; ...'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "left": {
+                        "type": "string",
+                        "description": "Name of the left dataset",
+                    },
+                    "right": {
+                        "type": "string",
+                        "description": "Name of the right dataset",
+                    },
+                    "on": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Key column(s) with the same name in both datasets",
+                    },
+                    "leftOn": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Key column(s) of the left dataset, when the names differ (use with rightOn instead of on)",
+                    },
+                    "rightOn": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Key column(s) of the right dataset, in the same order as leftOn",
+                    },
+                    "how": {
+                        "type": "string",
+                        "enum": ["inner", "left", "anti"],
+                        "description": "Join type (optional, defaults to inner)",
+                    },
+                    "name": {
+                        "type": "string",
+                        "description": "Name for the new dataset (optional, defaults to '<left>_<how>_<right>')",
+                    },
+                },
+                "required": ["left", "right"],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "findColumns",
+            "description": "Looks up columns of the current dataset by name, with their types and example values. Use it when the column list in the instructions is cut off or to find columns by topic. Example return: '3 of 1204 columns match 'price':\n- unit_price (float), e.g. '9.99'\n- price_band (category), e.g. 'low'\n- list_price (float), e.g. '12.5''",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "Case-insensitive substring (e.g. 'price'), wildcard pattern (e.g. 'sensor_1*') or regular expression (e.g. '^q[1-4]_')",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of columns to list (default 50)",
+                    },
+                },
+                "required": ["pattern"],
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    },
 ]
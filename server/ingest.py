@@ -0,0 +1,220 @@
+import csv
+import io
+import os
+
+import pandas as pd
+
+# CSV ingest engine. "pyarrow" uses Arrow's multithreaded CSV reader and falls
+# back to pandas if pyarrow is missing or a column doesn't fit the sampled type;
+# "pandas" uses the single-threaded pandas C parser.
+CSV_ENGINE = os.environ.get("CSV_ENGINE", "pyarrow")
+
+# How much of the file is read with pandas to infer column types
+SAMPLE_BYTES = int(os.environ.get("CSV_SAMPLE_BYTES", 1 << 20))
+
+# Header sniffing starts with this many characters and doubles until it holds
+# the header and one complete data row (quoted fields may span lines)
+SNIFF_CHARS = 64 * 1024
+
+SNIFF_DELIMITERS = ",;\t|"
+
+# Values that look like ISO dates, optionally with a time. Date columns stay
+# text in the shared frame, so tools that search or print them show the values
+# as uploaded; such columns are only labelled as dates for the assistant, and
+# timeSeries parses them when it needs them.
+ISO_DATETIME = r"\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?"
+
+# Allow long text fields in the sniffed rows (the csv module caps them at 128 KiB)
+csv.field_size_limit(2**31 - 1)
+
+# Names accepted for per-column dtype overrides, mapped to pandas dtypes
+DTYPE_ALIASES = {
+    "int": "int64",
+    "integer": "int64",
+    "int64": "int64",
+    "float": "float64",
+    "float64": "float64",
+    "number": "float64",
+    "str": "object",
+    "string": "object",
+    "object": "object",
+    "bool": "bool",
+    "boolean": "bool",
+    "category": "category",
+    "datetime": "datetime64[ns]",
+    "date": "datetime64[ns]",
+}
+
+
+def normalize_dtypes(dtypes: dict | None) -> dict:
+    """Validates per-column overrides and maps them to pandas dtype names."""
+    normalized = {}
+    for column, dtype in (dtypes or {}).items():
+        key = str(dtype).lower()
+        if key not in DTYPE_ALIASES:
+            raise ValueError(f"Unsupported dtype '{dtype}' for column '{column}'")
+        normalized[column] = DTYPE_ALIASES[key]
+    return normalized
+
+
+def sniff_csv(csv_string: str, sample_chars: int = SNIFF_CHARS) -> dict:
+    """
+    Reads the header and first data row from the start of the CSV without
+    touching the rest of it. Detects the delimiter and respects quoting, so
+    "Smith, John" stays one field.
+    Returns a dict with headers, data_row and delimiter.
+    """
+    size = sample_chars
+    while True:
+        sample = csv_string[:size].lstrip("\ufeff\r\n")
+        complete = size >= len(csv_string)
+
+        delimiter = ","
+        try:
+            head = "\n".join(sample.splitlines()[:10])
+            sniffed = csv.Sniffer().sniff(head, delimiters=SNIFF_DELIMITERS).delimiter
+        except csv.Error:
+            sniffed = ","
+
+        rows = _leading_rows(sample, ",")
+        if sniffed != ",":
+            # Only trust the sniffer when its delimiter gives a consistent layout
+            candidate = _leading_rows(sample, sniffed)
+            if len(candidate[0]) > 1 and (len(candidate) < 2 or len(candidate[0]) == len(candidate[1])):
+                delimiter, rows = sniffed, candidate
+
+        # Past the sample boundary the last row may be cut off; need one more
+        if complete or len(rows) >= 3:
+            break
+        size *= 2
+
+    return {
+        "headers": rows[0] if rows else [],
+        "data_row": rows[1] if len(rows) > 1 else [],
+        "delimiter": delimiter,
+    }
+
+
+def _leading_rows(sample: str, delimiter: str, limit: int = 3) -> list:
+    rows = []
+    for row in csv.reader(io.StringIO(sample, newline=""), delimiter=delimiter):
+        if not row:
+            continue  # blank line
+        rows.append(row)
+        if len(rows) == limit:
+            break
+    return rows
+
+
+def looks_like_dates(values: pd.Series) -> bool:
+    """True if values has any non-missing entries and all of them are ISO dates."""
+    values = values.dropna().astype(str)
+    return bool(len(values)) and bool(values.str.fullmatch(ISO_DATETIME).all())
+
+
+def sample_dtypes(
+    csv_string: str,
+    sample_bytes: int = SAMPLE_BYTES,
+    delimiter: str = ",",
+    detect_dates: bool = False,
+) -> dict:
+    """
+    Infers each column's dtype by parsing only the leading sample_bytes of the
+    CSV. With detect_dates, ISO date columns are reported as datetime64[ns]
+    (for describing them; read_csv keeps them as text).
+    """
+    sample = csv_string[:sample_bytes]
+    if len(csv_string) > sample_bytes and "\n" in sample:
+        sample = sample[: sample.rindex("\n")]  # drop the partial last line
+    df = pd.read_csv(io.StringIO(sample), sep=delimiter)
+    dtypes = {}
+    for column, dtype in df.dtypes.items():
+        dtypes[column] = dtype.name
+        if detect_dates and dtype == object and looks_like_dates(df[column]):
+            dtypes[column] = "datetime64[ns]"
+    return dtypes
+
+
+def _arrow_type(dtype: str):
+    import pyarrow as pa
+
+    return {
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "object": pa.string(),
+        "category": pa.string(),
+        "datetime64[ns]": pa.timestamp("ns"),
+    }.get(dtype)
+
+
+def _read_pyarrow(csv_string: str, dtypes: dict, delimiter: str) -> pd.DataFrame:
+    import pyarrow.csv as pacsv
+
+    column_types = {}
+    for column, dtype in dtypes.items():
+        arrow_type = _arrow_type(dtype)
+        if arrow_type is not None:
+            column_types[column] = arrow_type
+
+    table = pacsv.read_csv(
+        io.BytesIO(csv_string.encode("utf-8")),
+        read_options=pacsv.ReadOptions(use_threads=True),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types, strings_can_be_null=True
+        ),
+    )
+    df = table.to_pandas()
+    for column, dtype in dtypes.items():
+        if dtype == "category" and column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def _read_pandas(csv_string: str, dtypes: dict, delimiter: str) -> pd.DataFrame:
+    dates = [column for column, dtype in dtypes.items() if dtype.startswith("datetime")]
+    others = {column: dtype for column, dtype in dtypes.items() if column not in dates}
+    return pd.read_csv(
+        io.StringIO(csv_string),
+        sep=delimiter,
+        dtype=others or None,
+        parse_dates=dates or False,
+    )
+
+
+def read_csv(
+    csv_string: str,
+    dtypes: dict | None = None,
+    engine: str | None = None,
+    delimiter: str = ",",
+) -> pd.DataFrame:
+    """
+    Parses CSV text into a DataFrame.
+
+    Column types are inferred from a leading sample (see sample_dtypes) and
+    then fixed for the full parse, so every block of a multithreaded read
+    agrees on them. Dates stay text unless dtypes asks for them. dtypes
+    overrides the inferred type for specific columns.
+    """
+    engine = engine or CSV_ENGINE
+    overrides = normalize_dtypes(dtypes)
+
+    if engine == "pyarrow":
+        try:
+            sampled = sample_dtypes(csv_string, delimiter=delimiter)
+            sampled.update(overrides)
+            df = _read_pyarrow(csv_string, sampled, delimiter)
+            # pandas renames duplicate headers, Arrow doesn't; keep pandas' view
+            if list(df.columns) == list(sampled):
+                return df
+            print("pyarrow and pandas disagree on the header, using the pandas CSV parser")
+        except ImportError:
+            print("pyarrow is not installed, using the pandas CSV parser")
+        except Exception as e:
+            # Usually a column whose later rows don't match the sampled type
+            print(f"pyarrow CSV parse failed ({str(e)}), using the pandas CSV parser")
+    elif engine != "pandas":
+        raise ValueError(f"Unknown CSV engine '{engine}'")
+
+    return _read_pandas(csv_string, overrides, delimiter)
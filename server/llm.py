@@ -1,7 +1,5 @@
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
-from functioncalls import *
 from functions import AItools
 
 def load_api_key():
@@ -14,6 +12,8 @@ def load_api_key():
 
 def initialize_client(api_key):
     """Initialize the OpenAI client with the provided API key."""
+    from openai import OpenAI
+
     return OpenAI(api_key=api_key)
 
 def create_assistant(client):
@@ -49,6 +49,24 @@ def list_messages(client, thread_id):
     """List messages in the specified thread."""
     return client.beta.threads.messages.list(thread_id=thread_id)
 
+def summarize_conversation(client, summary, messages, model="gpt-4o-mini"):
+    """Fold (role, text) messages into a running summary of a data analysis conversation."""
+    transcript = "\n\n".join(f"{role}: {text}" for role, text in messages)
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": "You maintain a running summary of a conversation between a user and a data analysis assistant. Update the summary with the new messages. Keep the user's goals and questions, the columns and datasets involved, the numbers and findings reported, charts produced and anything left open. Be concise and factual; write at most 250 words.",
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew messages:\n{transcript}",
+            },
+        ],
+    )
+    return response.choices[0].message.content.strip()
+
 def main():
     api_key = load_api_key()
     client = initialize_client(api_key)
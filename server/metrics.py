@@ -0,0 +1,102 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Prometheus metrics exposed on /metrics. Process CPU/memory metrics come from
+# prometheus_client's default collectors.
+
+# Buckets span quick stats on small files up to multi-second scans and LLM runs
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+TOOL_DURATION_SECONDS = Histogram(
+    "datadave_tool_duration_seconds",
+    "Wall-clock time of each assistant tool call",
+    ["tool"],
+    buckets=LATENCY_BUCKETS,
+)
+CSV_INGEST_SECONDS = Histogram(
+    "datadave_csv_ingest_seconds",
+    "Time to hash, parse headers and store an uploaded CSV",
+    buckets=LATENCY_BUCKETS,
+)
+CSV_PARSE_SECONDS = Histogram(
+    "datadave_csv_parse_seconds",
+    "Time to parse CSV text into a DataFrame",
+    buckets=LATENCY_BUCKETS,
+)
+CHART_ENCODE_SECONDS = Histogram(
+    "datadave_chart_encode_seconds",
+    "Time to render a chart to PNG",
+    buckets=LATENCY_BUCKETS,
+)
+RUN_WAIT_SECONDS = Histogram(
+    "datadave_run_wait_seconds",
+    "Time spent waiting on an OpenAI run between actions (polling included)",
+    buckets=LATENCY_BUCKETS,
+)
+TOOL_SUBMIT_SECONDS = Histogram(
+    "datadave_tool_submit_seconds",
+    "Round trip of submitting tool outputs to OpenAI",
+    buckets=LATENCY_BUCKETS,
+)
+
+TOOL_TIMEOUTS_TOTAL = Counter(
+    "datadave_tool_timeouts_total",
+    "Tool calls abandoned after exceeding their time budget",
+    ["tool"],
+)
+RUNS_CANCELLED_TOTAL = Counter(
+    "datadave_runs_cancelled_total", "Assistant runs stopped by cancel_run"
+)
+
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "datadave_scheduler_wait_seconds",
+    "Time tool calls spend queued before a worker picks them up",
+    buckets=LATENCY_BUCKETS,
+)
+SCHEDULER_QUEUED = Gauge("datadave_scheduler_queued", "Tool calls waiting for a worker")
+SCHEDULER_RUNNING = Gauge("datadave_scheduler_running", "Tool calls running on workers")
+SCHEDULER_REJECTED_TOTAL = Counter(
+    "datadave_scheduler_rejected_total",
+    "Tool calls refused because too many were queued or abandoned",
+    ["reason"],
+)
+
+TOOL_CACHE_REQUESTS_TOTAL = Counter(
+    "datadave_tool_cache_requests_total",
+    "Tool result cache lookups, by outcome (hit or miss)",
+    ["tool", "result"],
+)
+TOOL_CACHE_EVICTIONS_TOTAL = Counter(
+    "datadave_tool_cache_evictions_total", "Tool results evicted to stay under the byte budget"
+)
+TOOL_CACHE_BYTES = Gauge("datadave_tool_cache_bytes", "Estimated bytes held by the tool result cache")
+TOOL_CACHE_ENTRIES = Gauge("datadave_tool_cache_entries", "Tool results held in the cache")
+
+SNAPSHOT_WRITE_SECONDS = Histogram(
+    "datadave_snapshot_write_seconds",
+    "Time to write one round of dataset and thread snapshots",
+    buckets=LATENCY_BUCKETS,
+)
+SNAPSHOTS_RESTORED_TOTAL = Counter(
+    "datadave_snapshots_restored_total", "Threads whose datasets were restored from a snapshot"
+)
+
+CONTEXT_SUMMARY_SECONDS = Histogram(
+    "datadave_context_summary_seconds",
+    "Time to fold older thread messages into the rolling summary",
+    buckets=LATENCY_BUCKETS,
+)
+
+ACTIVE_SESSIONS = Gauge(
+    "datadave_active_sessions", "Connected sessions with a valid API key"
+)
+ACTIVE_THREADS = Gauge("datadave_active_threads", "Chat threads held in memory")
+DATASET_RESIDENT_BYTES = Gauge(
+    "datadave_dataset_resident_bytes", "Bytes of CSV data held by the dataset store"
+)
+
+
+def render_metrics():
+    """Returns the exposition payload and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
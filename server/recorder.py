@@ -0,0 +1,49 @@
+import os
+import time
+
+from tracing import jsonl_sink
+
+# Optional recording of each run's tool-call sequence for offline replay
+# (see bench/replay.py). Set DATADAVE_RECORD_PATH to a JSONL file to enable it.
+_record_path = os.environ.get("DATADAVE_RECORD_PATH", "")
+record_sink = jsonl_sink(_record_path) if _record_path else None
+
+
+def start_recording(
+    thread_id: str,
+    run_id: str,
+    dataset: str | None,
+    delimiter: str = ",",
+    dtypes: dict = None,
+) -> dict | None:
+    """
+    Returns a new run record, or None when recording is off. The dataset's
+    delimiter and dtype overrides are kept so a replay parses it as the
+    server did.
+    """
+    if record_sink is None:
+        return None
+    return {
+        "recorded_at": time.time(),
+        "thread_id": thread_id,
+        "run_id": run_id,
+        "dataset": dataset,
+        "delimiter": delimiter,
+        "dtypes": dtypes or {},
+        "calls": [],
+    }
+
+
+def record_call(record: dict | None, step: int, name: str, arguments: dict) -> None:
+    if record is not None:
+        record["calls"].append({"step": step, "name": name, "arguments": arguments})
+
+
+def finish_recording(record: dict | None) -> None:
+    """Writes the run record if it contains any tool calls."""
+    if record is None or not record["calls"]:
+        return
+    try:
+        record_sink(record)
+    except Exception as e:
+        print(f"Error writing run record: {str(e)}")
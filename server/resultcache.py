@@ -0,0 +1,108 @@
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import (
+    TOOL_CACHE_REQUESTS_TOTAL,
+    TOOL_CACHE_EVICTIONS_TOTAL,
+    TOOL_CACHE_BYTES,
+    TOOL_CACHE_ENTRIES,
+)
+
+# Memoized tool results, keyed by (dataset hash, tool name, canonical
+# arguments). Datasets are content addressed and never change in place (an
+# append stores a new dataset), so entries don't need invalidating; the least
+# recently used are evicted to stay under TOOL_CACHE_BYTES. Charts are kept as
+# PNG bytes and sent again on a hit. Set TOOL_CACHE_BYTES=0 to turn it off.
+CACHE_BYTES = int(os.environ.get("TOOL_CACHE_BYTES", 64 << 20))
+
+# Tools whose result depends on more than the dataset and arguments
+UNCACHED_TOOLS = {"fetchMore", "listDatasets", "useDataset", "joinDatasets"}
+
+# Rough per-entry bookkeeping cost, so many tiny results still count
+ENTRY_OVERHEAD = 256
+
+_entries = OrderedDict()  # key -> {"result", "images", "nbytes"}
+_lock = threading.Lock()
+_total_bytes = 0
+_counts = {}  # tool -> {"hits": n, "misses": n}
+
+
+def cache_key(digest: str | None, name: str, fn, arguments: dict):
+    """
+    The cache key for a call, or None if it can't be cached. Arguments are
+    bound to fn's signature with defaults filled in, so calls that differ
+    only in argument order or in spelling out a default share an entry.
+    """
+    if CACHE_BYTES <= 0 or name in UNCACHED_TOOLS:
+        return None
+    try:
+        bound = inspect.signature(fn).bind(**arguments)
+    except TypeError:
+        return None  # let the call itself report the bad arguments
+    bound.apply_defaults()
+    canonical = json.dumps(bound.arguments, sort_keys=True, separators=(",", ":"), default=str)
+    return (digest, name, canonical)
+
+
+def _count(name: str, outcome: str) -> None:
+    TOOL_CACHE_REQUESTS_TOTAL.labels(tool=name, result=outcome).inc()
+    counts = _counts.setdefault(name, {"hits": 0, "misses": 0})
+    counts["hits" if outcome == "hit" else "misses"] += 1
+
+
+def lookup(key) -> dict | None:
+    """Returns the cached {"result", "images"} for key and marks it recently used, or None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+        _count(key[1], "hit" if entry is not None else "miss")
+    return entry
+
+
+def store(key, result, images: list) -> None:
+    """Caches a result and the PNG bytes of the charts it produced."""
+    global _total_bytes
+    nbytes = (
+        ENTRY_OVERHEAD
+        + len(key[2])
+        + len(str(result).encode("utf-8"))
+        + sum(len(image) for image in images)
+    )
+    if nbytes > CACHE_BYTES:
+        return
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _total_bytes -= old["nbytes"]
+        _entries[key] = {"result": result, "images": images, "nbytes": nbytes}
+        _total_bytes += nbytes
+        while _total_bytes > CACHE_BYTES:
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= evicted["nbytes"]
+            TOOL_CACHE_EVICTIONS_TOTAL.inc()
+        TOOL_CACHE_BYTES.set(_total_bytes)
+        TOOL_CACHE_ENTRIES.set(len(_entries))
+
+
+def stats() -> dict:
+    """Size of the cache and hit rates, overall and per tool."""
+    with _lock:
+        tools = {
+            name: {**counts, "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"])}
+            for name, counts in sorted(_counts.items())
+        }
+        hits = sum(counts["hits"] for counts in _counts.values())
+        requests = hits + sum(counts["misses"] for counts in _counts.values())
+        return {
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "budget_bytes": CACHE_BYTES,
+            "hits": hits,
+            "misses": requests - hits,
+            "hit_rate": hits / requests if requests else None,
+            "tools": tools,
+        }
@@ -0,0 +1,217 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import (
+    SCHEDULER_QUEUED,
+    SCHEDULER_RUNNING,
+    SCHEDULER_WAIT_SECONDS,
+    SCHEDULER_REJECTED_TOTAL,
+)
+
+# Fair scheduling of tool calls across sessions. Calls wait in per-session
+# queues and at most TOOL_WORKERS run at once. The next call to run is picked
+# by start-time fair queuing: each call is tagged with a virtual start time,
+# and a session's tags advance by the expected cost of its calls (learned per
+# tool and dataset size) divided by its weight. A session issuing heavy calls
+# therefore falls behind sessions issuing light ones, which keeps the wait for
+# light calls bounded however much heavy work is queued.
+
+# Tools run concurrently on this many threads, so they must not share mutable
+# state: charts, which draw on pyplot's global figure, take turns under
+# functioncalls.chart_lock while the rest of their work runs in parallel
+TOOL_WORKERS = int(os.environ.get("TOOL_WORKERS", 8))
+
+# Admission limits: calls beyond these are refused rather than queued
+MAX_QUEUED_PER_SESSION = int(os.environ.get("SCHEDULER_MAX_QUEUED_PER_SESSION", 16))
+MAX_QUEUED = int(os.environ.get("SCHEDULER_MAX_QUEUED", 256))
+
+# Calls a session gave up on (timed out or cancelled) keep their worker until
+# they return, since Python threads can't be stopped. A session with this
+# many still running gets no new calls until they finish, so runaway calls
+# can't take over the workers.
+MAX_ABANDONED_PER_SESSION = int(os.environ.get("SCHEDULER_MAX_ABANDONED_PER_SESSION", 2))
+
+# Expected seconds for a kind of call not seen yet
+DEFAULT_COST = 0.05
+
+# Weight of the newest observation in the running cost estimates
+COST_SMOOTHING = 0.3
+
+_lock = threading.Condition()
+_queues = {}  # session -> deque of queued jobs
+_finish_tags = {}  # session -> virtual finish time of its last queued job
+_running = {}  # session -> number of its jobs running
+_started = {}  # future -> job, for jobs taken off the queues
+_abandoned = {}  # session -> number of its abandoned jobs still running
+_costs = {}  # cost key -> smoothed seconds
+_clock = 0.0  # start tag of the most recently started job
+_order = itertools.count()
+_workers = []
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+def _start_workers():
+    while len(_workers) < TOOL_WORKERS:
+        worker = threading.Thread(
+            target=_work, name=f"tool-{len(_workers)}", daemon=True
+        )
+        _workers.append(worker)
+        worker.start()
+
+
+def estimated_cost(cost_key) -> float:
+    return _costs.get(cost_key, DEFAULT_COST)
+
+
+def submit(session: str, fn, cost_key=None, weight: float = 1.0) -> Future:
+    """
+    Queues fn() to run on a worker thread on behalf of session and returns a
+    Future for its result. cost_key groups calls expected to take similar
+    time (e.g. tool name and dataset size). Sessions with a higher weight get
+    a proportionally larger share of the workers. Raises SchedulerBusy when
+    the session or the whole server has too many calls waiting, or the
+    session has MAX_ABANDONED_PER_SESSION abandoned calls still running.
+    """
+    with _lock:
+        _start_workers()
+        queue = _queues.get(session)
+        queued = sum(len(q) for q in _queues.values())
+        if _abandoned.get(session, 0) >= MAX_ABANDONED_PER_SESSION:
+            SCHEDULER_REJECTED_TOTAL.labels(reason="abandoned").inc()
+            raise SchedulerBusy("Earlier tool calls of this session are still being stopped")
+        if queue is not None and len(queue) >= MAX_QUEUED_PER_SESSION:
+            SCHEDULER_REJECTED_TOTAL.labels(reason="session").inc()
+            raise SchedulerBusy("Too many tool calls are waiting for this session")
+        if queued >= MAX_QUEUED:
+            SCHEDULER_REJECTED_TOTAL.labels(reason="server").inc()
+            raise SchedulerBusy("Too many tool calls are waiting on the server")
+
+        cost = estimated_cost(cost_key)
+        # A session returning from idle starts at the current virtual time
+        # instead of spending credit built up while it had nothing queued
+        start = max(_finish_tags.get(session, 0.0), _clock)
+        _finish_tags[session] = start + cost / weight
+        job = {
+            "fn": fn,
+            "session": session,
+            "cost_key": cost_key,
+            "cost": cost,
+            "weight": weight,
+            "start_tag": start,
+            "order": next(_order),
+            "queued_at": time.perf_counter(),
+            "future": Future(),
+        }
+        _queues.setdefault(session, deque()).append(job)
+        SCHEDULER_QUEUED.inc()
+        _lock.notify()
+    return job["future"]
+
+
+def queue_position(future: Future) -> int:
+    """How many queued calls will start before this one; 0 once it has started."""
+    with _lock:
+        job = None
+        for queue in _queues.values():
+            job = next((j for j in queue if j["future"] is future), None)
+            if job is not None:
+                break
+        if job is None:
+            return 0
+        tag = (job["start_tag"], job["order"])
+        return 1 + sum(
+            1
+            for queue in _queues.values()
+            for other in queue
+            if (other["start_tag"], other["order"]) < tag
+        )
+
+
+def abandon(future: Future) -> None:
+    """
+    Gives up on a call: a queued call is dropped, a running one counts
+    against its session's MAX_ABANDONED_PER_SESSION until it returns.
+    """
+    if future.cancel():
+        return
+    with _lock:
+        job = _started.get(future)
+        if job is not None and not job.get("abandoned"):
+            job["abandoned"] = True
+            _abandoned[job["session"]] = _abandoned.get(job["session"], 0) + 1
+
+
+def cancel_session(session: str) -> None:
+    """Drops a session's queued calls (its running calls finish in the background)."""
+    with _lock:
+        queue = _queues.pop(session, deque())
+        for job in queue:
+            job["future"].cancel()
+        SCHEDULER_QUEUED.dec(len(queue))
+        if not _running.get(session):
+            _finish_tags.pop(session, None)
+
+
+def _next_job():
+    global _clock
+    heads = [
+        (queue[0]["start_tag"], queue[0]["order"], session)
+        for session, queue in _queues.items()
+        if queue
+    ]
+    _, _, session = min(heads)
+    queue = _queues[session]
+    job = queue.popleft()
+    if not queue:
+        del _queues[session]
+    _clock = max(_clock, job["start_tag"])
+    _running[session] = _running.get(session, 0) + 1
+    _started[job["future"]] = job
+    SCHEDULER_QUEUED.dec()
+    return job
+
+
+def _work():
+    while True:
+        with _lock:
+            while not _queues:
+                _lock.wait()
+            job = _next_job()
+
+        session = job["session"]
+        future = job["future"]
+        started = time.perf_counter()
+        if future.set_running_or_notify_cancel():
+            SCHEDULER_WAIT_SECONDS.observe(started - job["queued_at"])
+            SCHEDULER_RUNNING.inc()
+            try:
+                future.set_result(job["fn"]())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                SCHEDULER_RUNNING.dec()
+
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _running[session] -= 1
+            if not _running[session]:
+                del _running[session]
+            del _started[future]
+            if job.get("abandoned"):
+                _abandoned[session] -= 1
+                if not _abandoned[session]:
+                    del _abandoned[session]
+            if future.cancelled():
+                continue
+            key = job["cost_key"]
+            _costs[key] = (1 - COST_SMOOTHING) * estimated_cost(key) + COST_SMOOTHING * elapsed
+            # Charge the session for what the call really took
+            if session in _finish_tags:
+                _finish_tags[session] += (elapsed - job["cost"]) / job["weight"]
@@ -1,6 +1,5 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from functioncalls import *
 from flask_cors import CORS
 from llm import (
     initialize_client,
@@ -9,14 +8,55 @@ from llm import (
     send_message,
     run_assistant,
     list_messages,
+    summarize_conversation,
 )
+from datastore import (
+    csv_hasher,
+    has_dataset,
+    get_dataset,
+    store_dataset,
+    attach_dataset,
+    append_dataset,
+    get_frame,
+    activate_dataset,
+    active_dataset,
+    thread_datasets,
+    release_thread,
+    DEFAULT_DATASET,
+    preload_frame,
+    resident_bytes,
+)
+from metrics import (
+    TOOL_DURATION_SECONDS,
+    CSV_INGEST_SECONDS,
+    RUN_WAIT_SECONDS,
+    TOOL_SUBMIT_SECONDS,
+    TOOL_TIMEOUTS_TOTAL,
+    CONTEXT_SUMMARY_SECONDS,
+    RUNS_CANCELLED_TOTAL,
+    ACTIVE_SESSIONS,
+    ACTIVE_THREADS,
+    DATASET_RESIDENT_BYTES,
+    render_metrics,
+)
+from tracing import trace_turn, span
+from recorder import start_recording, record_call, finish_recording
+import resultcache
+import scheduler
+import snapshots
+import atexit
+import contextvars
+import hashlib
 import json
+import threading
 import time
-from PIL import Image
 from io import BytesIO
 import base64
 import os
 
+# functioncalls (pandas, Matplotlib), openai and PIL are imported on first use
+# so a new instance can start serving quickly; see prewarm() below.
+
 # Base instructions for the assistant
 BASE_INSTRUCTIONS = """You are a data analysis agent with access only to CSV headers and one sample row. Never attempt to access full data directly - use provided analysis tools instead. If a function returns an error, stop using it and try alternatives. If that doesn't work, just suggest alternatives. Always verify data types before analysis and clearly state any limitations."""
 
@@ -35,6 +75,47 @@ socketio = SocketIO(
 client_api_keys = {}
 client_instances = {}
 
+# Threads created or joined by each session, so their datasets can be released on disconnect
+session_threads = {}
+
+# A thread's datasets are kept this long after the last session holding it
+# disconnects, so a client that reconnects (with a new session id) and
+# rejoins the thread still has its data
+THREAD_RELEASE_GRACE_SECONDS = float(os.environ.get("THREAD_RELEASE_GRACE_SECONDS", 600))
+
+# Threads waiting to be released, each with the token of its latest release request
+pending_releases = {}
+
+# Chunked uploads in progress, by (session id, the client's upload_id), so
+# sessions choosing the same id don't touch each other's uploads (see send_csv_chunk)
+pending_uploads = {}
+
+# Largest CSV accepted through send_csv_chunk
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 1 << 30))
+
+# Runs in progress, by thread: the Event cancel_run sets to stop them
+run_cancellations = {}
+
+# Wall-clock budget of a tool call in seconds; TOOL_BUDGETS (a JSON object)
+# overrides it per tool, e.g. {"searchValue": 10, "correlationAnalysis": 60}
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("TOOL_TIMEOUT_SECONDS", 30))
+TOOL_BUDGETS = json.loads(os.environ.get("TOOL_BUDGETS", "{}"))
+
+# "bounded": runs see the last CONTEXT_LAST_MESSAGES messages of their thread
+# (more while the summary catches up), and older messages are folded into a
+# rolling summary passed in the run instructions, so prompts stop growing
+# with the conversation.
+# "full": runs see the whole thread.
+THREAD_CONTEXT = os.environ.get("THREAD_CONTEXT", "bounded")
+CONTEXT_LAST_MESSAGES = int(os.environ.get("CONTEXT_LAST_MESSAGES", 16))
+# The summary is brought up to date in batches of this many messages
+SUMMARY_BATCH = min(int(os.environ.get("SUMMARY_BATCH", 6)), CONTEXT_LAST_MESSAGES - 1)
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-4o-mini")
+
+
+class RunCancelled(Exception):
+    pass
+
 
 @socketio.on("set_api_key")
 def handle_api_key(api_key):
@@ -65,11 +146,104 @@ def handle_disconnect():
         del client_api_keys[request.sid]
     if request.sid in client_instances:
         del client_instances[request.sid]
+    scheduler.cancel_session(request.sid)
+    for sid, upload_id in list(pending_uploads):
+        if sid == request.sid:
+            del pending_uploads[(sid, upload_id)]
+    for thread_id in session_threads.pop(request.sid, set()):
+        schedule_release(thread_id)
+
+
+def thread_in_use(thread_id):
+    return any(thread_id in threads for threads in session_threads.values())
+
+
+def schedule_release(thread_id):
+    """
+    Releases a thread's datasets THREAD_RELEASE_GRACE_SECONDS after its last
+    session left, unless a session joins it again meanwhile.
+    """
+    if thread_in_use(thread_id):
+        return
+    token = object()
+    pending_releases[thread_id] = token
+
+    def release():
+        socketio.sleep(THREAD_RELEASE_GRACE_SECONDS)
+        if pending_releases.get(thread_id) is token and not thread_in_use(thread_id):
+            del pending_releases[thread_id]
+            release_thread(thread_id)
+
+    socketio.start_background_task(release)
 
 
 # Store active thread information
 active_threads = {}
 
+ACTIVE_SESSIONS.set_function(lambda: len(client_instances))
+ACTIVE_THREADS.set_function(lambda: len(active_threads))
+DATASET_RESIDENT_BYTES.set_function(resident_bytes)
+
+
+# Readiness: set once prewarm() has loaded the analysis stack
+warm_state = {"ready": False, "seconds": None}
+
+
+def prewarm():
+    """
+    Imports the analysis and OpenAI modules and renders a throwaway chart, so
+    fonts and renderer caches are loaded before the first real request.
+    """
+    started = time.perf_counter()
+    try:
+        import functioncalls
+        import openai
+        import matplotlib.pyplot as plt
+        import pandas as pd
+
+        pd.read_csv(BytesIO(b"a,b\n1,x\n2,y\n"))
+        plt.figure()
+        plt.bar(["a", "b"], [1, 2])
+        plt.title("warmup")
+        plt.savefig(BytesIO(), format="png")
+        plt.close("all")
+    except Exception as e:
+        print(f"Prewarm failed: {str(e)}")
+    warm_state["seconds"] = time.perf_counter() - started
+    warm_state["ready"] = True
+    print(f"Prewarm finished in {warm_state['seconds']:.2f}s")
+
+
+if snapshots.SNAPSHOT_DIR:
+    snapshots.start_snapshots()
+    atexit.register(snapshots.flush)
+
+if os.environ.get("DATADAVE_PREWARM", "1") == "1":
+    threading.Thread(target=prewarm, daemon=True).start()
+else:
+    warm_state["ready"] = True
+
+
+@app.route("/ready")
+def ready():
+    """Readiness probe: 503 until the prewarm step has finished."""
+    if warm_state["ready"]:
+        return jsonify({"ready": True, "prewarm_seconds": warm_state["seconds"]})
+    return jsonify({"ready": False}), 503
+
+
+@app.route("/cache")
+def cache_stats():
+    """Tool result cache size and hit rates, overall and per tool."""
+    return jsonify(resultcache.stats())
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    payload, content_type = render_metrics()
+    return Response(payload, content_type=content_type)
+
 
 @socketio.on("connect")
 def handle_connect():
@@ -86,11 +260,27 @@ def handle_join_thread(data):
     Allows a client to join a specific chat thread room.
     Args:
         data: Dictionary containing thread_id to join
-    Emits a status message confirming the room join operation.
+    If the server no longer holds the thread's datasets (e.g. after a
+    restart) they are restored from its snapshot and csv_processed is sent
+    with restored set. Emits a status message confirming the room join operation.
     """
     thread_id = data.get("thread_id")
     if thread_id:
         join_room(thread_id)
+        # Back after a restart or a release: the datasets come from disk
+        restored = not thread_datasets(thread_id) and snapshots.restore_thread(thread_id)
+        if restored:
+            active_threads.setdefault(thread_id, {"messages": []})
+        if thread_id in active_threads or thread_datasets(thread_id):
+            # Hold the thread's datasets for this session too (e.g. after a reconnect)
+            session_threads.setdefault(request.sid, set()).add(thread_id)
+            pending_releases.pop(thread_id, None)
+        if restored:
+            name, dataset = active_dataset(thread_id)
+            emit(
+                "csv_processed",
+                {"thread_id": thread_id, "headers": dataset["headers"], "name": name, "restored": True},
+            )
         emit("status", {"msg": f"Joined thread {thread_id}"})
 
 
@@ -102,12 +292,8 @@ def handle_create_thread():
     Emits thread creation confirmation with the new thread ID.
     """
     thread = create_thread(client)
-    active_threads[thread.id] = {
-        "messages": [],
-        "csv_data": None,
-        "headers": None,
-        "data_row": None,
-    }
+    active_threads[thread.id] = {"messages": []}
+    session_threads.setdefault(request.sid, set()).add(thread.id)
     join_room(thread.id)
     emit("thread_created", {"thread_id": thread.id, "status": "created"})
 
@@ -129,122 +315,427 @@ def handle_send_message(data):
         client = client_instances[request.sid]["client"]
         assistant = client_instances[request.sid]["assistant"]
 
-        # Send message
-        message = send_message(client, thread_id, message_content)
-        emit(
-            "message_sent",
-            {"thread_id": thread_id, "message": message_content, "role": "user"},
-            room=thread_id,
-        )
+        cancel = run_cancellations[thread_id] = threading.Event()
+        with trace_turn("send_message", thread_id=thread_id, sid=request.sid) as trace:
+            # Send message
+            with span("message_send", chars=len(message_content)):
+                message = send_message(client, thread_id, message_content)
+            emit(
+                "message_sent",
+                {"thread_id": thread_id, "message": message_content, "role": "user"},
+                room=thread_id,
+            )
 
-        # Build context including CSV data if available
-        context = BASE_INSTRUCTIONS
-        if thread_id in active_threads and active_threads[thread_id]["data_row"]:
-            headers = active_threads[thread_id]["headers"]
-            data_row = active_threads[thread_id]["data_row"]
-            context += f"\nThe CSV file contains these columns: {', '.join(headers)}."
-            context += f"\nAn example row contains: {dict(zip(headers, data_row))}"
-            context += "\nReference this data structure in your analysis and responses."
-
-        # Run assistant with context
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id, assistant_id=assistant.id, instructions=context
-        )
+            # Build context including CSV data if available
+            context = BASE_INSTRUCTIONS
+            dataset_name, dataset = active_dataset(thread_id)
+            if dataset is not None:
+                from functioncalls import schemaContext
 
-        # Poll for run completion and handle function calls
-        while True:
-            run_status = client.beta.threads.runs.retrieve(
-                thread_id=thread_id, run_id=run.id
-            )
+                context += f"\n{schemaContext(dataset['digest'])}"
+                context += "\nReference this data structure in your analysis and responses."
+                names = thread_datasets(thread_id)
+                if len(names) > 1:
+                    context += (
+                        f"\nDatasets loaded in this thread: {', '.join(names)}. The tools work on "
+                        f"'{dataset_name}' (described above); use useDataset to switch, listDatasets "
+                        "to see their columns, and joinDatasets to combine them."
+                    )
 
-            if run_status.status == "requires_action":
-                tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
-                tool_outputs = []
-
-                # Create a map of all available functions
-                function_map = {
-                    "calculateMean": calculateMean,
-                    "calculateMedian": calculateMedian,
-                    "calculateMode": calculateMode,
-                    "calculateVariance": calculateVariance,
-                    "calculateStandardDeviation": calculateStandardDeviation,
-                    "countRows": countRows,  # Note: Using lambda since it doesn't need parameters
-                    "getColumnInfo": getColumnInfo,
-                    "searchValue": searchValue,
-                    "searchRowDetails": searchRowDetails,  # Add the new search function
-                    "bargraphToImage": bargraphToImage,  # Add the new graph function
-                    "histoToImage": histoToImage,  # Add the histogram function
-                    "bargraphToImage": bargraphToImage,
-                    "colNameToPiechart": colNameToPiechart,  # Add the new graph function
-                    "get_filtered_results_from_string": get_filtered_results_from_string,
-                    "listToPiechart": listToPiechart,
-                    "correlationAnalysis": correlationAnalysis,
-                    "calculateMeanfromList": calculateMeanfromList,
-                    "calculateMedianfromList": calculateMedianfromList,
-                    "calculateModefromList": calculateModefromList,
-                    "calculateVariancefromList": calculateVariancefromList,
-                    "calculateStandardDeviationfromList": calculateStandardDeviationfromList,
-                    "bargraphToImagefromList": bargraphToImagefromList,
+            run_options = {}
+            if THREAD_CONTEXT == "bounded":
+                run_options["truncation_strategy"] = {
+                    "type": "last_messages",
+                    "last_messages": context_window(client, thread_id),
                 }
+                summary = active_threads.get(thread_id, {}).get("summary")
+                if summary:
+                    context += (
+                        "\nSummary of the earlier conversation (those messages are no longer "
+                        f"shown to you): {summary}"
+                    )
 
-                # Process each tool call and collect outputs
-                for tool_call in tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-
-                    try:
-                        if function_name in function_map:
-                            print(
-                                f"Executing function: {function_name} with args: {function_args}"
-                            )
-                            result = function_map[function_name](**function_args)
-                        else:
-                            result = f"Function {function_name} not implemented"
-
-                        tool_outputs.append(
-                            {"tool_call_id": tool_call.id, "output": str(result)}
-                        )
-                    except Exception as func_error:
-                        tool_outputs.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "output": f"Error executing {function_name}: {str(func_error)}",
-                            }
-                        )
+            # Run assistant with context
+            with span("run_create", instructions_chars=len(context)) as run_span:
+                run = client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=assistant.id,
+                    instructions=context,
+                    **run_options,
+                )
+                run_span["run_id"] = run.id
+            wait_started = time.perf_counter()
+            if dataset is not None:
+                record = start_recording(
+                    thread_id, run.id, dataset["digest"], dataset["delimiter"], dataset["dtypes"]
+                )
+            else:
+                record = start_recording(thread_id, run.id, None)
+            step = 0
 
-                # Submit all tool outputs together
-                if tool_outputs:
-                    client.beta.threads.runs.submit_tool_outputs(
-                        thread_id=thread_id, run_id=run.id, tool_outputs=tool_outputs
+            # Poll for run completion and handle function calls
+            while True:
+                if cancel.is_set():
+                    stop_run(client, thread_id, run.id)
+                    finish_recording(record)
+                    emit("run_cancelled", {"thread_id": thread_id, "run_id": run.id}, room=thread_id)
+                    return
+
+                with span("run_poll") as poll_span:
+                    run_status = client.beta.threads.runs.retrieve(
+                        thread_id=thread_id, run_id=run.id
                     )
-                continue
+                    poll_span["status"] = run_status.status
 
-            if run_status.status == "completed":
-                break
+                if run_status.status in ("requires_action", "completed"):
+                    RUN_WAIT_SECONDS.observe(time.perf_counter() - wait_started)
 
-            time.sleep(1)
+                if run_status.status == "requires_action":
+                    tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
+                    tool_outputs = []
 
-        # Get and broadcast response
-        messages = list_messages(client, thread_id)
-        emit(
-            "message_received",
-            {
-                "thread_id": thread_id,
-                "messages": [
+                    # Process each tool call and collect outputs
+                    for tool_call in tool_calls:
+                        function_name = tool_call.function.name
+                        function_args = json.loads(tool_call.function.arguments)
+                        record_call(record, step, function_name, function_args)
+
+                        with span(
+                            "tool_call",
+                            tool=function_name,
+                            args_bytes=len(tool_call.function.arguments),
+                        ) as tool_span:
+                            try:
+                                result = run_tool_call(
+                                    function_name, function_args, cancel, thread_id
+                                )
+
+                                tool_outputs.append(
+                                    {"tool_call_id": tool_call.id, "output": str(result)}
+                                )
+                            except RunCancelled:
+                                tool_span["error"] = "cancelled"
+                                break
+                            except Exception as func_error:
+                                tool_span["error"] = str(func_error)
+                                tool_outputs.append(
+                                    {
+                                        "tool_call_id": tool_call.id,
+                                        "output": f"Error executing {function_name}: {str(func_error)}",
+                                    }
+                                )
+                            tool_span["output_bytes"] = len(tool_outputs[-1]["output"])
+
+                    if cancel.is_set():
+                        continue  # stopped above, without submitting
+
+                    # Submit all tool outputs together
+                    if tool_outputs:
+                        with span("tool_submit", outputs=len(tool_outputs)):
+                            with TOOL_SUBMIT_SECONDS.time():
+                                client.beta.threads.runs.submit_tool_outputs(
+                                    thread_id=thread_id,
+                                    run_id=run.id,
+                                    tool_outputs=tool_outputs,
+                                )
+                    wait_started = time.perf_counter()
+                    step += 1
+                    continue
+
+                if run_status.status == "completed":
+                    finish_recording(record)
+                    break
+
+                if run_status.status in ("failed", "cancelled", "expired", "incomplete"):
+                    finish_recording(record)
+                    raise RuntimeError(f"Assistant run {run_status.status}")
+
+                with span("poll_sleep"):
+                    sleep_unless_cancelled(cancel, 1)
+
+            # Get and broadcast response
+            with span("list_messages"):
+                messages = list_messages(client, thread_id)
+            with span("emit", messages=len(messages.data)):
+                emit(
+                    "message_received",
                     {
-                        "role": msg.role,
-                        "content": msg.content[0].text.value,
-                        "timestamp": msg.created_at,
-                    }
-                    for msg in messages.data
-                ],
-            },
-            room=thread_id,
-        )
+                        "thread_id": thread_id,
+                        "messages": [
+                            {
+                                "role": msg.role,
+                                "content": msg.content[0].text.value,
+                                "timestamp": msg.created_at,
+                            }
+                            for msg in messages.data
+                        ],
+                    },
+                    room=thread_id,
+                )
+
+            if THREAD_CONTEXT == "bounded":
+                schedule_summary(client, thread_id)
+
+        # Optional timeline for the requesting client only
+        if data.get("debug"):
+            emit("trace", trace)
 
     except Exception as e:
         print(f"Error: {str(e)}")
         emit("error", {"msg": str(e)})
+    finally:
+        if run_cancellations.get(thread_id) is cancel:
+            del run_cancellations[thread_id]
+
+
+@socketio.on("cancel_run")
+def handle_cancel_run(data):
+    """
+    Stops the thread's assistant run.
+    Args:
+        data: Dictionary containing thread_id
+    The remote run is cancelled and tool calls in flight are abandoned; the
+    handler running the turn emits run_cancelled to the thread's room.
+    """
+    thread_id = data.get("thread_id")
+    cancel = run_cancellations.get(thread_id)
+    if cancel is None:
+        emit("error", {"msg": "No run in progress for this thread"})
+        return
+    print(f"Cancelling run on thread {thread_id}")
+    cancel.set()
+
+
+def schedule_summary(client, thread_id):
+    """Updates the thread's rolling summary in a background thread, one update at a time."""
+    state = active_threads.get(thread_id)
+    if state is None or state.get("summarizing"):
+        return
+    state["summarizing"] = True
+
+    def run():
+        try:
+            update_summary(client, thread_id, state)
+        except Exception as e:
+            print(f"Error summarizing thread {thread_id}: {str(e)}")
+        finally:
+            state["summarizing"] = False
+
+    # A real thread: the OpenAI client blocks, which would stall the event loop
+    threading.Thread(target=run, daemon=True).start()
+
+
+def context_window(client, thread_id):
+    """
+    Returns how many of the thread's latest messages the run should see: at
+    least CONTEXT_LAST_MESSAGES, and every message not yet in the summary, so
+    a summary update that is still running (or failed) leaves no gap between
+    the summary and the window.
+    """
+    state = active_threads.get(thread_id, {})
+    options = {"thread_id": thread_id, "order": "asc", "limit": 100}
+    if state.get("summarized_through"):
+        options["after"] = state["summarized_through"]
+    pending = sum(1 for _ in client.beta.threads.messages.list(**options))  # follows pages
+    return max(CONTEXT_LAST_MESSAGES, pending)
+
+
+def update_summary(client, thread_id, state):
+    """
+    Once CONTEXT_LAST_MESSAGES messages are not yet in the summary, folds in
+    the oldest of them, leaving the newest CONTEXT_LAST_MESSAGES - SUMMARY_BATCH.
+    Every message older than the run's window is then in the summary.
+    """
+    # A clear_thread while this runs makes the result stale
+    generation = state.get("clears", 0)
+    options = {"thread_id": thread_id, "order": "asc", "limit": 100}
+    if state.get("summarized_through"):
+        options["after"] = state["summarized_through"]
+    pending = list(client.beta.threads.messages.list(**options))  # follows pages
+    if len(pending) < CONTEXT_LAST_MESSAGES:
+        return
+
+    older = pending[: len(pending) - (CONTEXT_LAST_MESSAGES - SUMMARY_BATCH)]
+    with CONTEXT_SUMMARY_SECONDS.time():
+        summary = summarize_conversation(
+            client,
+            state.get("summary"),
+            [
+                (msg.role, " ".join(part.text.value for part in msg.content if getattr(part, "text", None)))
+                for msg in older
+            ],
+            SUMMARY_MODEL,
+        )
+    if state.get("clears", 0) != generation:
+        print(f"Discarding summary of thread {thread_id}, which was cleared meanwhile")
+        return
+    state["summary"] = summary
+    state["summarized_through"] = older[-1].id
+    print(f"Summarized {len(older)} older messages of thread {thread_id}")
+
+
+def sleep_unless_cancelled(cancel, seconds):
+    """Sleeps cooperatively (letting other socket events through), waking early on cancel."""
+    deadline = time.perf_counter() + seconds
+    while not cancel.is_set() and time.perf_counter() < deadline:
+        socketio.sleep(0.05)
+
+
+def stop_run(client, thread_id, run_id):
+    """Cancels a remote run and waits briefly for it to stop, so the thread accepts new messages."""
+    RUNS_CANCELLED_TOTAL.inc()
+    with span("run_cancel"):
+        try:
+            run = client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            deadline = time.perf_counter() + 10
+            while run.status in ("cancelling", "queued", "in_progress", "requires_action"):
+                if time.perf_counter() >= deadline:
+                    break
+                socketio.sleep(0.25)
+                run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        except Exception as e:
+            # Usually the run already finished
+            print(f"Could not cancel run {run_id}: {str(e)}")
+
+
+def run_tool_call(function_name, function_args, cancel, thread_id):
+    """
+    Runs a tool call through the scheduler, which shares the tool workers
+    fairly between sessions (see scheduler.py), while the handler keeps
+    polling for cancellation. Returns the tool's result, or a message for the
+    assistant if the server is too busy or the call runs past its time budget
+    (counted from when it starts); raises RunCancelled if cancel is set
+    meanwhile. While the call waits, tool_queued tells the thread's room its
+    place in the queue (position 0 once it starts). Socket events the tool emits are sent here, once it
+    has finished.
+
+    The call works on the thread's active dataset as of submission, carried
+    in its context (functioncalls.tool_dataset): other sessions switching
+    datasets while it waits in the queue don't affect it.
+
+    Python threads can't be killed: an abandoned call finishes in the
+    background and its result is discarded (tools check for cancellation
+    between steps, and the scheduler limits how many abandoned calls a
+    session can leave running).
+    """
+    from functioncalls import pending_emits, tool_cancel, tool_dataset
+
+    budget = float(TOOL_BUDGETS.get(function_name, TOOL_TIMEOUT_SECONDS))
+    events = []
+    stop = threading.Event()
+    _, dataset = active_dataset(thread_id)
+    if dataset is not None:
+        working_set = (dataset["csv_data"], dataset["digest"], thread_id)
+    else:
+        working_set = ("", None, thread_id)
+
+    def call():
+        pending_emits.set(events)
+        tool_cancel.set(stop)
+        tool_dataset.set(working_set)
+        return execute_tool(function_name, function_args, working_set[1])
+
+    # Calls on the same tool and a dataset of similar size cost about the same
+    size_class = dataset["nbytes"].bit_length() if dataset is not None else 0
+    try:
+        # Run in a copy of the context so the call's spans land in this turn's trace
+        context = contextvars.copy_context()
+        future = scheduler.submit(
+            request.sid, lambda: context.run(call), (function_name, size_class)
+        )
+    except scheduler.SchedulerBusy as e:
+        return f"Error: {str(e)}. The server is busy; try again shortly."
+
+    submitted = time.perf_counter()
+    position = None
+    deadline = None
+    while not future.done():
+        if cancel.is_set():
+            scheduler.abandon(future)
+            stop.set()
+            raise RunCancelled()
+        if deadline is None:
+            if future.running():
+                deadline = time.perf_counter() + budget
+                if position:
+                    # Let the client know the wait is over
+                    emit(
+                        "tool_queued",
+                        {"thread_id": thread_id, "tool": function_name, "position": 0},
+                        room=thread_id,
+                    )
+            elif time.perf_counter() - submitted >= 0.1:  # not just waiting on a free worker
+                queued = scheduler.queue_position(future)
+                if queued and queued != position:
+                    emit(
+                        "tool_queued",
+                        {"thread_id": thread_id, "tool": function_name, "position": queued},
+                        room=thread_id,
+                    )
+                position = queued
+        elif time.perf_counter() >= deadline:
+            scheduler.abandon(future)
+            stop.set()
+            TOOL_TIMEOUTS_TOTAL.labels(tool=function_name).inc()
+            print(f"Tool {function_name} exceeded its {budget:g}s budget")
+            return (
+                f"Error: {function_name} did not finish within its {budget:g}s time budget and "
+                "was stopped. Try a narrower request (fewer rows or columns) or another tool."
+            )
+        socketio.sleep(0.02)
+
+    result = future.result()
+    for event, payload, kwargs in events:
+        emit(event, payload, **kwargs)
+    return result
+
+
+def execute_tool(function_name, function_args, digest=None):
+    """
+    Runs one assistant tool call from function_map, recording its duration.
+    Results are served from the result cache when the same call was already
+    made on the same dataset (see resultcache.py); a cached chart is sent
+    again. Only calls whose socket events are queued (see run_tool_call) are
+    cached, since their charts can be captured. digest is the dataset the
+    call was submitted for, which keys its cache entry.
+    """
+    import functioncalls
+    from functioncalls import function_map
+
+    if function_name not in function_map:
+        return f"Function {function_name} not implemented"
+
+    fn = function_map[function_name]
+    events = functioncalls.pending_emits.get()
+    key = None
+    if events is not None and digest is not None:
+        key = resultcache.cache_key(digest, function_name, fn, function_args)
+    if key is not None:
+        cached = resultcache.lookup(key)
+        if cached is not None:
+            print(f"Serving cached result for {function_name}")
+            for image in cached["images"]:
+                functioncalls.emitImage(base64.b64encode(image).decode("utf-8"))
+            return cached["result"]
+
+    print(f"Executing function: {function_name} with args: {function_args}")
+    emitted = len(events) if events is not None else 0
+    functioncalls.result_cacheable.set(True)
+    with TOOL_DURATION_SECONDS.labels(tool=function_name).time():
+        result = fn(**function_args)
+
+    new_events = events[emitted:] if events is not None else []
+    cancel = functioncalls.tool_cancel.get()
+    if (
+        key is not None
+        and not (cancel is not None and cancel.is_set())  # may be cut short
+        and functioncalls.result_cacheable.get()
+        and not str(result).startswith("Error")
+        and all(event == "image_received" for event, _, _ in new_events)
+    ):
+        images = [base64.b64decode(payload["image_data"]) for _, payload, _ in new_events]
+        resultcache.store(key, result, images)
+    return result
 
 
 @socketio.on("clear_thread")
@@ -257,7 +748,22 @@ def handle_clear_thread(data):
     """
     thread_id = data.get("thread_id")
     if thread_id in active_threads:
-        active_threads[thread_id]["messages"] = []
+        state = active_threads[thread_id]
+        state["messages"] = []
+        state.pop("summary", None)
+        state["clears"] = state.get("clears", 0) + 1
+        # The OpenAI thread keeps its messages: start later summaries after
+        # the newest, so the cleared conversation isn't summarized again
+        state.pop("summarized_through", None)
+        if request.sid in client_instances:
+            try:
+                newest = client_instances[request.sid]["client"].beta.threads.messages.list(
+                    thread_id=thread_id, order="desc", limit=1
+                )
+                if newest.data:
+                    state["summarized_through"] = newest.data[0].id
+            except Exception as e:
+                print(f"Could not find the newest message of thread {thread_id}: {str(e)}")
         emit(
             "thread_cleared",
             {"thread_id": thread_id, "status": "cleared"},
@@ -267,70 +773,275 @@ def handle_clear_thread(data):
         emit("error", {"msg": "Invalid thread_id"})
 
 
+@socketio.on("send_csv_hash")
+def handle_send_csv_hash(data):
+    """
+    Upload-skip handshake sent before a CSV upload.
+    Args:
+        data: Dictionary containing thread_id, hash (hex SHA-256 of the CSV text)
+              and optionally name (the dataset's name in the thread)
+    Emits csv_hash_status with status "present" if the server already holds the
+    dataset (the thread is attached to it and analysis starts without an upload),
+    or "missing" if the client should follow up with send_csv.
+    """
+    thread_id = data.get("thread_id")
+    digest = data.get("hash")
+    name = data.get("name") or DEFAULT_DATASET
+
+    if thread_id not in active_threads:
+        emit("error", {"msg": "Invalid thread_id"})
+        return
+
+    if not digest or not has_dataset(digest):
+        emit(
+            "csv_hash_status",
+            {"thread_id": thread_id, "hash": digest, "status": "missing"},
+        )
+        return
+
+    emit(
+        "csv_hash_status",
+        {"thread_id": thread_id, "hash": digest, "status": "present"},
+    )
+    try:
+        start_csv_analysis(thread_id, digest, name)
+    except Exception as e:
+        print(f"CSV Processing Error: {str(e)}")
+        emit("error", {"msg": f"Error processing CSV: {str(e)}"})
+
+
 @socketio.on("send_csv")
 def handle_send_csv(data):
     thread_id = data.get("thread_id")
     csv_content = data.get("csvContent")
+    dtypes = data.get("dtypes")  # optional {column: type} parse overrides
+    name = data.get("name") or DEFAULT_DATASET  # a new name adds a dataset to the thread
 
     try:
-        # Parse CSV headers
-        headers = getFirstRowFromCSV(csv_content)
-        dataRow = getFirstDataRowFromCSV(csv_content)
-        print(f"Processing CSV with headers: {headers}")
-
-        # Store CSV info in thread data
-        active_threads[thread_id].update(
-            {"csv_data": csv_content, "headers": headers, "data_row": dataRow}
-        )
+        with CSV_INGEST_SECONDS.time():
+            hasher = csv_hasher(csv_content)
+            digest = store_csv(csv_content, hasher.hexdigest(), dtypes)
+            # Lets a later send_csv_append continue the hash without rereading the text
+            get_dataset(digest).setdefault("hasher", hasher)
 
-        # Store CSV content globally for function calls
-        setcsv(csv_content)
+        start_csv_analysis(thread_id, digest, name)
 
-        # Send confirmation to client
-        emit(
-            "csv_processed",
-            {"thread_id": thread_id, "headers": headers},
-            room=thread_id,
-        )
+    except Exception as e:
+        print(f"CSV Processing Error: {str(e)}")
+        emit("error", {"msg": f"Error processing CSV: {str(e)}"})
 
-        # Build initial context with CSV information
-        context = f"{BASE_INSTRUCTIONS}\n"
-        context += f"The CSV file contains these columns: {', '.join(headers)}.\n"
-        context += f"An example row contains: {dict(zip(headers, dataRow))}\n"
-        context += "Please acknowledge this data structure and explain what kind of analysis you can perform based on the column types and content."
 
-        # Create initial message with timestamp
-        initial_timestamp = time.time()
-        message = send_message(
-            client, thread_id, "I've loaded a CSV file. It is ready to be analyzed."
-        )
+def store_csv(csv_content, digest, dtypes=None):
+    """Stores uploaded CSV text under its hash unless it is already stored. Returns the hash."""
+    from ingest import normalize_dtypes, sniff_csv
 
-        run = run_assistant(client, thread_id, assistant.id, context)
+    if has_dataset(digest):
+        print(f"Dataset {digest[:12]} already stored, reusing it")
+        return digest
+    normalize_dtypes(dtypes)  # reject bad overrides before storing
+    # Parse CSV headers from the start of the file only
+    sniffed = sniff_csv(csv_content)
+    headers = sniffed["headers"]
+    dataRow = sniffed["data_row"]
+    print(f"Processing CSV with headers: {headers}")
+    return store_dataset(digest, csv_content, headers, dataRow, dtypes, sniffed["delimiter"])
+
+
+@socketio.on("send_csv_chunk")
+def handle_send_csv_chunk(data):
+    """
+    Receives a CSV upload in pieces, so a large file starts uploading at once
+    and no single message has to hold all of it.
+    Args:
+        data: Dictionary containing thread_id, upload_id (chosen by the
+              client), index (0, 1, ... in order), chunk (the next piece of
+              the CSV text) and final (true on the last piece). The first
+              piece may also carry name and dtypes, as for send_csv.
+    Pieces are hashed as they arrive. Each one is acknowledged with
+    {upload_id, index} (or {error}) so the client can limit how many it has
+    in flight; after the final piece the dataset is stored and analysed as
+    with send_csv.
+    """
+    upload_id = data.get("upload_id")
+    index = data.get("index")
+    chunk = data.get("chunk") or ""
+    key = (request.sid, upload_id)
+
+    if index == 0:
+        pending_uploads[key] = {
+            "thread_id": data.get("thread_id"),
+            "name": data.get("name") or DEFAULT_DATASET,
+            "dtypes": data.get("dtypes"),
+            "chunks": [],
+            "bytes": 0,
+            "hasher": hashlib.sha256(),
+        }
+    upload = pending_uploads.get(key)
+    error = None
+    if upload is None:
+        error = "Unknown upload; start the upload again"
+    elif index != len(upload["chunks"]):
+        error = f"Expected piece {len(upload['chunks'])} of the upload, got {index}"
+    else:
+        encoded = chunk.encode("utf-8")
+        upload["bytes"] += len(encoded)
+        if upload["bytes"] > MAX_UPLOAD_BYTES:
+            error = f"The file is larger than the {MAX_UPLOAD_BYTES >> 20} MB upload limit"
+        else:
+            upload["hasher"].update(encoded)
+            upload["chunks"].append(chunk)
+    if error is not None:
+        pending_uploads.pop(key, None)
+        emit("error", {"msg": error})
+        return {"upload_id": upload_id, "error": error}
+
+    if not data.get("final"):
+        return {"upload_id": upload_id, "index": index}
+
+    del pending_uploads[key]
+    try:
+        with CSV_INGEST_SECONDS.time():
+            csv_content = "".join(upload["chunks"])
+            upload["chunks"].clear()
+            digest = store_csv(csv_content, upload["hasher"].hexdigest(), upload["dtypes"])
+            # Lets a later send_csv_append continue the hash without rereading the text
+            get_dataset(digest).setdefault("hasher", upload["hasher"])
+        print(f"Received {upload['bytes']} bytes in {index + 1} pieces")
+
+        start_csv_analysis(upload["thread_id"], digest, upload["name"])
+    except Exception as e:
+        print(f"CSV Processing Error: {str(e)}")
+        emit("error", {"msg": f"Error processing CSV: {str(e)}"})
+        return {"upload_id": upload_id, "error": str(e)}
+    return {"upload_id": upload_id, "index": index, "digest": digest}
+
+
+@socketio.on("send_csv_append")
+def handle_send_csv_append(data):
+    """
+    Appends rows to the thread's dataset without restarting the conversation.
+    Args:
+        data: Dictionary containing thread_id, csvContent (the new rows,
+              with or without the header line) and optionally name (which
+              dataset to extend; defaults to the active one)
+    Only the new rows are parsed; cached statistics are updated in place of
+    being recomputed. Emits csv_appended with the new dataset hash and row counts.
+    """
+    thread_id = data.get("thread_id")
+    rows = data.get("csvContent")
+
+    if thread_id not in active_threads:
+        emit("error", {"msg": "Invalid thread_id"})
+        return
+    if request.sid not in client_instances:
+        emit("error", {"msg": "No valid API key provided"})
+        return
+    client = client_instances[request.sid]["client"]
+    name = data.get("name")
+    if name is None:
+        name, dataset = active_dataset(thread_id)
+    digest = thread_datasets(thread_id).get(name)
+    if not digest or not has_dataset(digest):
+        emit("error", {"msg": "No dataset loaded for this thread"})
+        return
+    if not rows:
+        emit("error", {"msg": "Missing csvContent"})
+        return
+
+    try:
+        with CSV_INGEST_SECONDS.time():
+            new_digest, rows_added = append_dataset(digest, rows)
+        active_name, _ = active_dataset(thread_id)
+        attach_dataset(thread_id, new_digest, name)
+        total_rows = len(get_frame(new_digest))
+        print(f"Appended {rows_added} rows to {digest[:12]} -> {new_digest[:12]}")
+
+        # Extending another dataset doesn't switch the tools to it
+        if active_name != name:
+            activate_dataset(thread_id, active_name)
+        snapshots.save_thread_soon(thread_id)
+
+        # Let the assistant know on its next run that the data grew
+        try:
+            send_message(
+                client,
+                thread_id,
+                f"{rows_added} new rows were appended to the dataset '{name}'; it now has {total_rows} rows.",
+            )
+        except Exception as e:
+            print(f"Could not add append note to thread {thread_id}: {str(e)}")
 
-        # Get and send response with explicit timestamps
-        messages = list_messages(client, thread_id)
         emit(
-            "message_received",
+            "csv_appended",
             {
-                "messages": [
-                    {
-                        "role": msg.role,
-                        "content": msg.content[0].text.value,
-                        "timestamp": (
-                            initial_timestamp
-                            if msg.role == "user"
-                            else initial_timestamp + 1
-                        ),
-                    }
-                    for msg in messages.data
-                ]
+                "thread_id": thread_id,
+                "hash": new_digest,
+                "rows_added": rows_added,
+                "total_rows": total_rows,
             },
             room=thread_id,
         )
-
     except Exception as e:
-        print(f"CSV Processing Error: {str(e)}")
-        emit("error", {"msg": f"Error processing CSV: {str(e)}"})
+        print(f"CSV Append Error: {str(e)}")
+        emit("error", {"msg": f"Error appending CSV rows: {str(e)}"})
+
+
+def start_csv_analysis(thread_id, digest, name=DEFAULT_DATASET):
+    """
+    Attaches a stored dataset to a thread under name, makes it the active
+    dataset and asks the assistant for its initial overview of the data.
+    """
+    from functioncalls import schemaContext
+
+    dataset = attach_dataset(thread_id, digest, name)
+    snapshots.save_thread_soon(thread_id)
+    if dataset["frame"] is None:
+        # Parse while the assistant writes its overview
+        preload_frame(digest)
+    headers = dataset["headers"]
+
+    # Send confirmation to client
+    emit(
+        "csv_processed",
+        {"thread_id": thread_id, "headers": headers, "name": name},
+        room=thread_id,
+    )
+
+    # Build initial context with CSV information
+    context = f"{BASE_INSTRUCTIONS}\n"
+    if len(thread_datasets(thread_id)) > 1:
+        context += f"A new dataset named '{name}' was added to this thread; the tools now work on it.\n"
+    context += f"{schemaContext(digest)}\n"
+    context += "Please acknowledge this data structure and explain what kind of analysis you can perform based on the column types and content."
+
+    # Create initial message with timestamp
+    initial_timestamp = time.time()
+    message = send_message(
+        client, thread_id, "I've loaded a CSV file. It is ready to be analyzed."
+    )
+
+    run = run_assistant(client, thread_id, assistant.id, context)
+
+    # Get and send response with explicit timestamps
+    messages = list_messages(client, thread_id)
+    emit(
+        "message_received",
+        {
+            "messages": [
+                {
+                    "role": msg.role,
+                    "content": msg.content[0].text.value,
+                    "timestamp": (
+                        initial_timestamp
+                        if msg.role == "user"
+                        else initial_timestamp + 1
+                    ),
+                }
+                for msg in messages.data
+            ]
+        },
+        room=thread_id,
+    )
 
 
 @socketio.on("upload_image")
@@ -348,6 +1059,8 @@ def handle_upload_image(data):
         return
 
     try:
+        from PIL import Image
+
         # Decode the binary image data
         image_binary = base64.b64decode(image_data)
         image = Image.open(BytesIO(image_binary))
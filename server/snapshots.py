@@ -0,0 +1,340 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from datastore import (
+    datasets,
+    thread_refs,
+    active_names,
+    store_dataset,
+    attach_dataset,
+    activate_dataset,
+)
+from metrics import SNAPSHOT_WRITE_SECONDS, SNAPSHOTS_RESTORED_TOTAL
+
+# Snapshots of datasets and the threads using them, so a restart doesn't make
+# users upload again. Each dataset is written once under its hash: the CSV
+# text (gzipped, for tools that read it and to keep the hash), the parsed
+# frame as Parquet and the derived values (arrays in an .npz, the rest as
+# JSON inside it; nothing is unpickled on load); a thread's snapshot lists its
+# named datasets. Datasets come back when a client rejoins the thread, with
+# the frame and derived values loaded from disk on first use instead of
+# parsing the CSV again.
+#
+# Off unless DATADAVE_SNAPSHOT_DIR names a directory: snapshots keep users'
+# uploads on the server's disk for up to SNAPSHOT_TTL.
+SNAPSHOT_DIR = os.environ.get("DATADAVE_SNAPSHOT_DIR", "")
+
+# How often new frames, derived values and thread changes are written (a
+# thread is also written as soon as a dataset is attached to it)
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", 30))
+
+# Threads not used for this long are deleted, with datasets no thread uses
+SNAPSHOT_TTL = float(os.environ.get("SNAPSHOT_TTL_SECONDS", 7 * 24 * 3600))
+GC_INTERVAL = 3600
+
+# What has been written for each dataset: {"frame": bool, "derived": key count}
+_written = {}
+# Last metadata written for each thread
+_thread_state = {}
+_flush_lock = threading.Lock()
+_last_gc = 0.0
+
+
+def _dataset_dir(digest: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, "datasets", digest)
+
+
+def _thread_path(thread_id: str) -> str:
+    # Thread ids come from clients on join_thread; keep them inside the directory
+    safe = "".join(char for char in thread_id if char.isalnum() or char in "_-")
+    return os.path.join(SNAPSHOT_DIR, "threads", f"{safe}.json")
+
+
+def _write_atomic(path: str, write) -> None:
+    """Writes path through a temporary file, so a crash never leaves it half written."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.tmp"
+    write(temp)
+    os.replace(temp, path)
+
+
+def _write_file(path: str, data: bytes) -> None:
+    def write(temp):
+        with open(temp, "wb") as f:
+            f.write(data)
+
+    _write_atomic(path, write)
+
+
+def _encode(value, arrays: dict):
+    """
+    A JSON-able form of a derived value, with its arrays moved into arrays.
+    Raises TypeError for values that can't be stored without pickling.
+    """
+    import pandas as pd
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic) and not isinstance(value, (np.datetime64, np.timedelta64)):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            raise TypeError("object arrays are not stored")
+        name = f"a{len(arrays)}"
+        arrays[name] = value
+        return {"$array": name}
+    if isinstance(value, pd.DatetimeIndex):
+        return {"$datetimeindex": _encode(value.to_numpy(), arrays), "name": _encode(value.name, arrays)}
+    if isinstance(value, tuple):
+        return {"$tuple": [_encode(item, arrays) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        return {"$dict": [[_encode(k, arrays), _encode(v, arrays)] for k, v in value.items()]}
+    raise TypeError(f"{type(value).__name__} values are not stored")
+
+
+def _decode(value, arrays):
+    import pandas as pd
+
+    if isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if "$array" in value:
+        return arrays[value["$array"]]
+    if "$datetimeindex" in value:
+        return pd.DatetimeIndex(_decode(value["$datetimeindex"], arrays), name=_decode(value["name"], arrays))
+    if "$tuple" in value:
+        return tuple(_decode(item, arrays) for item in value["$tuple"])
+    return {_decode(k, arrays): _decode(v, arrays) for k, v in value["$dict"]}
+
+
+def _derived_bytes(derived: dict) -> bytes:
+    """The derived values that can be stored without pickling, as .npz bytes."""
+    arrays = {}
+    entries = []
+    for key, value in derived.items():
+        stored = dict(arrays)  # so a value that can't be stored leaves no arrays behind
+        try:
+            entries.append([_encode(key, stored), _encode(value, stored)])
+        except TypeError:
+            continue
+        arrays = stored
+    manifest = np.frombuffer(json.dumps(entries).encode("utf-8"), dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.savez(buffer, manifest=manifest, **arrays)
+    return buffer.getvalue()
+
+
+def _load_derived(path: str) -> dict:
+    with np.load(path, allow_pickle=False) as stored:
+        arrays = {name: stored[name] for name in stored.files}
+    entries = json.loads(arrays.pop("manifest").tobytes().decode("utf-8"))
+    return {_decode(key, arrays): _decode(value, arrays) for key, value in entries}
+
+
+def save_dataset(digest: str) -> None:
+    """Writes whatever of the dataset isn't on disk yet: text and metadata, frame, derived values."""
+    entry = datasets.get(digest)
+    if entry is None:
+        return
+    directory = _dataset_dir(digest)
+    written = _written.setdefault(digest, {"frame": False, "derived": 0})
+
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        _write_file(
+            os.path.join(directory, "csv.gz"),
+            gzip.compress(entry["csv_data"].encode("utf-8"), compresslevel=1),
+        )
+        meta = {
+            "digest": digest,
+            "headers": entry["headers"],
+            "data_row": entry["data_row"],
+            "dtypes": entry["dtypes"],
+            "delimiter": entry["delimiter"],
+        }
+        # Written last: a dataset directory without meta.json is incomplete
+        _write_file(os.path.join(directory, "meta.json"), json.dumps(meta).encode("utf-8"))
+
+    frame = entry["frame"]
+    if frame is not None and not written["frame"]:
+        try:
+            _write_atomic(
+                os.path.join(directory, "frame.parquet"),
+                lambda path: frame.to_parquet(path, index=False),
+            )
+            written["frame"] = True
+        except Exception as e:
+            # e.g. a text column with mixed values; rehydration parses the CSV
+            # instead and recomputes derived values, so don't retry or write them
+            print(f"Could not snapshot frame of dataset {digest[:12]}: {str(e)}")
+            written["frame"] = "failed"
+
+    derived = dict(entry["derived"])
+    if written["frame"] is True and len(derived) != written["derived"]:
+        _write_file(os.path.join(directory, "derived.npz"), _derived_bytes(derived))
+        written["derived"] = len(derived)
+
+
+def save_thread(thread_id: str) -> None:
+    """Writes the thread's datasets and, if they changed, its metadata."""
+    names = dict(thread_refs.get(thread_id, {}))
+    if not names:
+        return
+    for digest in set(names.values()):
+        save_dataset(digest)
+    state = {"datasets": names, "active": active_names.get(thread_id)}
+    path = _thread_path(thread_id)
+    if _thread_state.get(thread_id) == state:
+        if os.path.exists(path):
+            os.utime(path)  # still in use
+        return
+    payload = json.dumps({"thread_id": thread_id, "saved_at": time.time(), **state})
+    _write_file(path, payload.encode("utf-8"))
+    _thread_state[thread_id] = state
+
+
+def save_thread_soon(thread_id: str) -> None:
+    """
+    Snapshots one thread in a background thread, e.g. right after an upload,
+    so a restart before the next flush doesn't lose the dataset.
+    """
+    if not SNAPSHOT_DIR:
+        return
+
+    def run():
+        with _flush_lock:
+            try:
+                save_thread(thread_id)
+            except Exception as e:
+                print(f"Error writing snapshot of thread {thread_id}: {str(e)}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def flush() -> None:
+    """Snapshots every thread held in memory."""
+    if not SNAPSHOT_DIR:
+        return
+    with _flush_lock, SNAPSHOT_WRITE_SECONDS.time():
+        for thread_id in list(thread_refs):
+            try:
+                save_thread(thread_id)
+            except Exception as e:
+                print(f"Error writing snapshot of thread {thread_id}: {str(e)}")
+        if time.time() - _last_gc >= GC_INTERVAL:
+            collect_garbage()
+
+
+def collect_garbage() -> None:
+    """Deletes threads unused for SNAPSHOT_TTL and the datasets no remaining thread uses."""
+    global _last_gc
+    _last_gc = time.time()
+    threads_dir = os.path.join(SNAPSHOT_DIR, "threads")
+    datasets_dir = os.path.join(SNAPSHOT_DIR, "datasets")
+    used = set()
+    for filename in os.listdir(threads_dir) if os.path.isdir(threads_dir) else []:
+        path = os.path.join(threads_dir, filename)
+        try:
+            if time.time() - os.path.getmtime(path) > SNAPSHOT_TTL:
+                os.remove(path)
+                continue
+            with open(path, encoding="utf-8") as f:
+                used.update(json.load(f)["datasets"].values())
+        except Exception as e:
+            print(f"Skipping snapshot {filename}: {str(e)}")
+    for digest in os.listdir(datasets_dir) if os.path.isdir(datasets_dir) else []:
+        if digest not in used and digest not in datasets:
+            shutil.rmtree(os.path.join(datasets_dir, digest), ignore_errors=True)
+            _written.pop(digest, None)
+
+
+def load_dataset(digest: str) -> bool:
+    """
+    Stores a snapshotted dataset (CSV text and metadata) in the datastore.
+    Its frame and derived values are read from disk when first needed.
+    Returns False if there is no complete snapshot of it.
+    """
+    directory = _dataset_dir(digest)
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "csv.gz"), "rb") as f:
+            csv_content = gzip.decompress(f.read()).decode("utf-8")
+    except (OSError, ValueError) as e:
+        print(f"No usable snapshot of dataset {digest[:12]}: {str(e)}")
+        return False
+
+    store_dataset(
+        digest, csv_content, meta["headers"], meta["data_row"], meta["dtypes"], meta["delimiter"]
+    )
+    entry = datasets[digest]
+    if entry["frame"] is None:
+        entry["load_frame"] = lambda: _load_frame(digest)
+    return True
+
+
+def _load_frame(digest: str):
+    """Reads a snapshotted frame and its derived values, or returns None to parse the CSV."""
+    import pandas as pd
+
+    directory = _dataset_dir(digest)
+    try:
+        frame = pd.read_parquet(os.path.join(directory, "frame.parquet"))
+    except Exception:
+        return None
+    try:
+        derived = _load_derived(os.path.join(directory, "derived.npz"))
+        for key, value in derived.items():
+            datasets[digest]["derived"].setdefault(key, value)
+    except Exception:
+        derived = {}
+    _written[digest] = {"frame": True, "derived": len(derived)}
+    return frame
+
+
+def restore_thread(thread_id: str) -> bool:
+    """
+    Reattaches a thread's datasets from its snapshot, for a client rejoining
+    after a restart or reconnect. Returns True if the thread had a snapshot.
+    """
+    if not SNAPSHOT_DIR:
+        return False
+    try:
+        with open(_thread_path(thread_id), encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    restored = {}
+    for name, digest in snapshot["datasets"].items():
+        if digest in datasets or load_dataset(digest):
+            attach_dataset(thread_id, digest, name)
+            restored[name] = digest
+    if not restored:
+        return False
+    if snapshot.get("active") in restored:
+        activate_dataset(thread_id, snapshot["active"])
+    _thread_state[thread_id] = {"datasets": restored, "active": active_names.get(thread_id)}
+    SNAPSHOTS_RESTORED_TOTAL.inc()
+    print(f"Restored thread {thread_id} with datasets {', '.join(restored)}")
+    return True
+
+
+def start_snapshots() -> None:
+    """Starts writing snapshots every SNAPSHOT_INTERVAL seconds in a background thread."""
+
+    def run():
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL)
+            flush()
+
+    threading.Thread(target=run, daemon=True).start()
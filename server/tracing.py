@@ -0,0 +1,95 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Per-turn trace timelines. A trace is a plain dict with a list of spans; when a
+# turn finishes it is handed to trace_sink, which can be swapped with set_trace_sink.
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def jsonl_sink(path: str):
+    """Returns a sink that appends each finished trace as one JSON line to path."""
+    lock = threading.Lock()
+
+    def write(trace: dict) -> None:
+        line = json.dumps(trace, default=str)
+        with lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    return write
+
+
+# Set DATADAVE_TRACE_PATH to an empty string to turn tracing output off
+_trace_path = os.environ.get("DATADAVE_TRACE_PATH", "traces.jsonl")
+trace_sink = jsonl_sink(_trace_path) if _trace_path else None
+
+
+def set_trace_sink(sink) -> None:
+    """Replaces the trace sink. sink is a callable taking the finished trace dict, or None."""
+    global trace_sink
+    trace_sink = sink
+
+
+@contextmanager
+def trace_turn(name: str, **attrs):
+    """
+    Records a trace for the enclosed block and sends it to the sink on exit.
+    Yields the trace dict, which is complete once the block has exited.
+    """
+    trace = {
+        "trace_id": uuid.uuid4().hex,
+        "name": name,
+        "attrs": attrs,
+        "start": time.time(),
+        "spans": [],
+    }
+    started = time.perf_counter()
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        trace["error"] = str(e)
+        raise
+    finally:
+        current_trace.reset(token)
+        trace["duration"] = time.perf_counter() - started
+        if trace_sink is not None:
+            try:
+                trace_sink(trace)
+            except Exception as e:
+                print(f"Error writing trace: {str(e)}")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Records a timed span on the current trace, if any. Yields the span's attrs
+    dict so the caller can attach results (sizes, statuses) while it runs.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield attrs
+        return
+
+    offset = time.time() - trace["start"]
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = str(e)
+        raise
+    finally:
+        trace["spans"].append(
+            {
+                "name": name,
+                "offset": offset,
+                "duration": time.perf_counter() - started,
+                "attrs": attrs,
+            }
+        )